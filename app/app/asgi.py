@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# Django doesn't reuse persistent connections under ASGI, each request
+# would leave one open, https://code.djangoproject.com/ticket/33497. Serve
+# it behind pgbouncer, the Procfile serves app.wsgi.
+os.environ.setdefault("DB_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -14,6 +14,8 @@ from pathlib import Path
 import os
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -61,17 +63,23 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "core.renderers.ORJSONRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    "DEFAULT_SCHEMA_CLASS": "core.schema.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.JWTAuthentication",
         # 'rest_framework.authentication.BasicAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
     ],
@@ -94,7 +102,7 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": False,
-    "ALGORITHM": "HS256",
+    "ALGORITHM": os.environ.get("JWT_ALGORITHM", "HS256"),
     "VERIFYING_KEY": None,
     "AUDIENCE": None,
     "ISSUER": None,
@@ -105,15 +113,87 @@ SIMPLE_JWT = {
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
     "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
-    "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
+    "AUTH_TOKEN_CLASSES": ("user.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "user.authentication.FactoryTokenUser",
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.FactoryTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.FactoryTokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "user.serializers.FactoryTokenBlacklistSerializer",
     "JTI_CLAIM": "jti",
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# JWT_ALGORITHM=RS256 or EdDSA signs with the PEM private key in
+# JWT_PRIVATE_KEY_FILE, see the generate_jwt_key command. To rotate it, move
+# the public key of the previous one to JWT_PUBLIC_KEY_FILES (comma
+# separated) until its refresh tokens expired. Both are published for other
+# services at api/user/jwks/.
+JWT_PRIVATE_KEY_FILE = os.environ.get("JWT_PRIVATE_KEY_FILE", "")
+JWT_PUBLIC_KEY_FILES = list(
+    filter(None, os.environ.get("JWT_PUBLIC_KEY_FILES", "").split(","))
+)
+# Seconds other services may cache the key set for
+JWKS_CACHE_TIMEOUT = int(os.environ.get("JWKS_CACHE_TIMEOUT", 3600))
+
+# Build request.user from the access token claims instead of the database
+# on safe requests. Writes load the user, and so do requests of users that
+# were updated, deleted or set a password until their access tokens expire.
+# Refreshes always reload the claims. Needs a shared revocation cache, see
+# REVOCATION_CACHE_URL below.
+JWT_STATELESS_AUTH = os.environ.get("JWT_STATELESS_AUTH", "false").lower() == "true"
+
+# Seconds to cache factory statistics for, 0 disables the cache
+STATS_CACHE_TIMEOUT = int(os.environ.get("STATS_CACHE_TIMEOUT", 0))
+
+# Seconds to cache the responses of the read endpoints for, 0 disables the cache
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 0))
+RESPONSE_CACHE_ALIAS = "default"
+
+# In-process LRU cache by default, CACHE_URL selects a shared redis:// or
+# memcached:// server so that invalidations reach every worker
+CACHE_URL = os.environ.get("CACHE_URL", "")
+
+
+def cache_backend(url, location=""):
+    """Return the settings of the cache at url, in-process without one"""
+    if url.startswith(("redis://", "rediss://")):
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": url,
+        }
+    if url.startswith("memcached://"):
+        return {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": url.removeprefix("memcached://"),
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": location,
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000))},
+    }
+
+
+# The markers of users changed since their access tokens were issued, see
+# user.authentication, have to reach every worker and stay until those
+# tokens expire. They get their own cache, so the response cache never
+# evicts them: JWT_STATELESS_AUTH requires REVOCATION_CACHE_URL (CACHE_URL
+# by default) to be a redis:// server with the noeviction policy.
+REVOCATION_CACHE_ALIAS = "revocation"
+REVOCATION_CACHE_URL = os.environ.get("REVOCATION_CACHE_URL", CACHE_URL)
+if JWT_STATELESS_AUTH and not REVOCATION_CACHE_URL.startswith(
+    ("redis://", "rediss://")
+):
+    raise ImproperlyConfigured(
+        "JWT_STATELESS_AUTH requires a redis:// REVOCATION_CACHE_URL or CACHE_URL."
+    )
+
+CACHES = {
+    "default": cache_backend(CACHE_URL),
+    REVOCATION_CACHE_ALIAS: cache_backend(REVOCATION_CACHE_URL, "revocation"),
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -136,23 +216,103 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgres reads DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASS.
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# reuse. The Procfile serves app.wsgi, which reuses them. Serving app.asgi
+# is opt-in and requires pgbouncer in front of the database: Django doesn't
+# reuse connections under ASGI, so DB_CONN_MAX_AGE defaults to 0 there (see
+# app/asgi.py) and every request opens one. DB_PGBOUNCER=true is for a
+# pgbouncer in transaction pooling mode, which can't hold the server-side
+# cursors used by .iterator().
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "HOST": os.environ.get("DB_HOST"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            "NAME": os.environ.get("DB_NAME"),
+            "USER": os.environ.get("DB_USER"),
+            "PASSWORD": os.environ.get("DB_PASS"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": (
+                os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+            ),
+            "OPTIONS": {
+                "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # seconds a writer waits for the database lock
+            "OPTIONS": {"timeout": 20},
+        }
     }
+
+# DB_REPLICA_HOSTS is a comma separated list of read replicas of the primary,
+# reachable with its credentials. GET requests read from a random replica,
+# except for users who wrote in the last REPLICA_PIN_SECONDS, which should
+# cover the replication lag. The pins need a shared CACHE_URL to reach every
+# worker.
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), 1
+):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{number}")
+DATABASE_ROUTERS = ["core.db.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# Applied to every new SQLite connection by core.db
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -20000,
+    "temp_store": "memory",
+    "mmap_size": 134217728,
 }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'HOST': os.environ.get('DB_HOST'),
-#         'NAME': os.environ.get('DB_NAME'),
-#         'USER': os.environ.get('DB_USER'),
-#         'PASSWORD': os.environ.get('DB_PASS'),
-#     }
-# }
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+
+# PASSWORD_HASHER picks pbkdf2, scrypt or argon2 (needs argon2-cffi) for new
+# hashes, PASSWORD_HASHER_COST its iterations, work factor or time cost, 0
+# keeps Django's default. Stored hashes are upgraded on the next login.
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "pbkdf2")
+PASSWORD_HASHER_COST = int(os.environ.get("PASSWORD_HASHER_COST", 0))
+PASSWORD_HASHER_CLASSES = {
+    "pbkdf2": "core.hashers.PBKDF2PasswordHasher",
+    "scrypt": "core.hashers.ScryptPasswordHasher",
+    "argon2": "core.hashers.Argon2PasswordHasher",
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *(
+        hasher
+        for name, hasher in PASSWORD_HASHER_CLASSES.items()
+        if name != PASSWORD_HASHER
+    ),
+]
+
+AUTHENTICATION_BACKENDS = ["user.backends.CachedCredentialsBackend"]
+
+# Seconds to remember successful password checks for, 0 disables it. Logins
+# with a remembered password skip the hasher.
+CREDENTIALS_CACHE_TIMEOUT = int(os.environ.get("CREDENTIALS_CACHE_TIMEOUT", 0))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
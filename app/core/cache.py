@@ -0,0 +1,185 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+from core.db import replica_reads
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def generation_key(scope):
+    return f"generation:{scope}"
+
+
+def get_generations(scopes):
+    """Return the current generation of each scope"""
+    cache = get_cache()
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # start from the clock so an evicted counter never reuses old keys
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump(scopes):
+    """Move the scopes to a new generation, orphaning their cached responses"""
+    cache = get_cache()
+    for key in map(generation_key, scopes):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def response_hash(request, view, *parts):
+    """Hash what a response depends on besides the database"""
+    parts = [
+        type(view).__name__,
+        request.accepted_media_type,
+        request.get_full_path(),
+        *map(str, parts),
+    ]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def invalidate(*scopes):
+    """Invalidate the cached responses of the scopes once the write commits"""
+    # the statistics cache is keyed on the same generations
+    if settings.RESPONSE_CACHE_TIMEOUT or settings.STATS_CACHE_TIMEOUT:
+        transaction.on_commit(lambda: bump(scopes))
+
+
+def invalidate_factories(factory_ids):
+    """Invalidate the cached responses showing the factories"""
+    invalidate(
+        "factories",
+        *(f"factory:{factory_id}" for factory_id in factory_ids if factory_id),
+    )
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the If-None-Match header matches etag"""
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if "*" in etags or etag in (tag.removeprefix("W/") for tag in etags):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+    return None
+
+
+class CachedResponseMixin:
+    """Serve repeated GETs from the response cache
+
+    Views list the scopes their response depends on in get_cache_scopes(),
+    writes call invalidate() with the scopes they change. The ETag of a
+    cached response is kept with it, cache hits never touch the database.
+    Misses read from the primary, see core.db.
+    """
+
+    response_cache_key = None
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_response_cache_key(self):
+        scopes = self.get_cache_scopes()
+        # hashed to keep keys short enough for memcached
+        return "response:" + response_hash(
+            self.request, self, *scopes, *get_generations(scopes)
+        )
+
+    def get_cached_response(self, request):
+        """Return the cached response to the request, None on a miss"""
+        if not settings.RESPONSE_CACHE_TIMEOUT:
+            return None
+        key = self.get_response_cache_key()
+        cached = get_cache().get(key)
+        if cached is None:
+            self.response_cache_key = key
+            # a lagging replica would store an old body under the new generation
+            replica_reads.set(False)
+            return None
+        content, content_type, etag = cached
+        if etag and (response := not_modified(request, etag)):
+            return response
+        response = HttpResponse(content, content_type=content_type)
+        if etag:
+            response["ETag"] = etag
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        response = await sync_to_async(self.get_cached_response)(request)
+        if response is None:
+            response = await super().aget(request, *args, **kwargs)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            self.response_cache_key
+            and isinstance(response, Response)
+            and response.status_code == 200
+        ):
+            response.render()
+            get_cache().set(
+                self.response_cache_key,
+                (response.content, response["Content-Type"], response.get("ETag")),
+                settings.RESPONSE_CACHE_TIMEOUT,
+            )
+        return response
+
+
+class ETagMixin:
+    """Answer GETs whose If-None-Match matches the current version with a 304
+
+    Views return a value changing with every write to what they show from
+    get_etag_version(), async views may override aget_etag_version(). Put it
+    after CachedResponseMixin in the bases.
+    """
+
+    def get_etag_version(self):
+        raise NotImplementedError
+
+    async def aget_etag_version(self):
+        return await sync_to_async(self.get_etag_version)()
+
+    def get_etag(self, version):
+        return quote_etag(response_hash(self.request, self, version))
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(self.get_etag_version())
+        if response := not_modified(request, etag):
+            return response
+        # the version is read first, a concurrent write can only make the
+        # body newer than its tag
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        etag = self.get_etag(await self.aget_etag_version())
+        if response := not_modified(request, etag):
+            return response
+        response = await super().aget(request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+        return response
@@ -0,0 +1,78 @@
+import random
+from contextvars import ContextVar
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+
+# set by core.middleware.ReplicaMiddleware for requests allowed to read
+# from a replica, everything else reads from the primary
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+async def aiterate(queryset, chunk_size):
+    """Async queryset.iterator(), fetching each chunk in the sync thread
+
+    Django 5.0's aiterator() runs values_list() queries on the event loop.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield row
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to a new SQLite connection"""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def primary_pin_key(user_id):
+    return f"primary-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Read from the primary for the user until their writes reached the replicas"""
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(primary_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def use_primary_if_pinned(user):
+    """Turn off replica reads for the request of a user who just wrote"""
+    if replica_reads.get() and cache.get(primary_pin_key(user.pk)):
+        replica_reads.set(False)
+
+
+class ReplicaRouter:
+    """Send reads to a random replica while replica_reads is on
+
+    Writes go to the primary and turn replica reads off for the rest of the
+    request, so that it reads its own writes. Only the primary is migrated,
+    the replicas copy its schema.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and replica_reads.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        replica_reads.set(False)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class CostMixin:
+    """Take the cost of the preferred hasher from settings.PASSWORD_HASHER_COST
+
+    Changing the cost makes check_password() rehash stored passwords on the
+    next successful login, like switching settings.PASSWORD_HASHER does.
+    """
+
+    profile = None
+
+    def get_cost(self, default):
+        if settings.PASSWORD_HASHER == self.profile and settings.PASSWORD_HASHER_COST:
+            return settings.PASSWORD_HASHER_COST
+        return default
+
+
+class PBKDF2PasswordHasher(CostMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with PASSWORD_HASHER_COST iterations"""
+
+    profile = "pbkdf2"
+
+    @property
+    def iterations(self):
+        return self.get_cost(super().iterations)
+
+
+class ScryptPasswordHasher(CostMixin, hashers.ScryptPasswordHasher):
+    """Scrypt with a PASSWORD_HASHER_COST work factor, a power of 2"""
+
+    profile = "scrypt"
+
+    @property
+    def work_factor(self):
+        return self.get_cost(super().work_factor)
+
+
+class Argon2PasswordHasher(CostMixin, hashers.Argon2PasswordHasher):
+    """Argon2 with a PASSWORD_HASHER_COST time cost, needs argon2-cffi"""
+
+    profile = "argon2"
+
+    @property
+    def time_cost(self):
+        return self.get_cost(super().time_cost)
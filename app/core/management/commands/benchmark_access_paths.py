@@ -0,0 +1,103 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Equipment, Factory, FactoryStats
+
+
+SEED_CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    """Django command to print the plans and timings of the hot queries
+
+    Compare the indexes by running it once after `migrate core 0003` and
+    once after `migrate core`, on the same seeded database.
+    """
+
+    help = "Print EXPLAIN output and timings for the hot equipment and user queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Number of equipment rows to create before measuring",
+        )
+        parser.add_argument("--factories", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(options["seed"], options["factories"])
+
+        factory = Factory.objects.order_by("id").first()
+        if factory is None:
+            self.stdout.write("No factories, run with --seed")
+            return
+        start = date(2020, 1, 1)
+        queries = {
+            "active equipment of a factory": Equipment.objects.filter(
+                factory=factory, status=True
+            ),
+            "equipment of a factory by date range": Equipment.objects.filter(
+                factory=factory, date__range=(start, start + timedelta(days=90))
+            ),
+            "staff users of a factory": get_user_model().objects.filter(
+                factory=factory, is_staff=True
+            ),
+            "last factory": Factory.objects.order_by("-pk")[:1],
+        }
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                begin = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - begin)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(f"median {statistics.median(timings) * 1000:.2f} ms\n")
+
+    def seed(self, count, factories):
+        """Create count equipment spread over factories, with a staff user each"""
+        User = get_user_model()
+        offset = Equipment.objects.count()
+        with transaction.atomic():
+            created = Factory.objects.bulk_create(
+                Factory(
+                    name=f"Benchmark {i}",
+                    address="Address",
+                    city="City",
+                    country="Country",
+                )
+                for i in range(factories)
+            )
+            User.objects.bulk_create(
+                User(
+                    email=f"benchmark{offset}-{factory.id}@factory.com",
+                    surname="Benchmark",
+                    is_staff=True,
+                    factory=factory,
+                )
+                for factory in created
+            )
+        for chunk_start in range(0, count, SEED_CHUNK_SIZE):
+            chunk = range(chunk_start, min(chunk_start + SEED_CHUNK_SIZE, count))
+            Equipment.objects.bulk_create(
+                Equipment(
+                    factory=created[i % factories],
+                    name=f"Benchmark {offset + i}",
+                    description="Description",
+                    price=i % 1000,
+                    date=date(2020, 1, 1) + timedelta(days=i % 1460),
+                    status=i % 4 != 0,
+                )
+                for i in chunk
+            )
+            self.stdout.write(f"{chunk.stop} equipment created")
+        # bulk_create skips the rollup hooks of the API
+        FactoryStats.objects.rebuild([factory.id for factory in created])
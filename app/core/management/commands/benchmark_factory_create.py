@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Factory
+from factory.serializers import FactorySerializer, default_user_fields
+
+
+def factory_data(i):
+    return {
+        "name": f"Benchmark {i}",
+        "address": "Address",
+        "city": "City",
+        "country": "Country",
+    }
+
+
+def create_with_password(data):
+    """Create a factory the way FactorySerializer did before token passwords"""
+    user = get_user_model().objects.create_user(
+        password="changeme", **default_user_fields(data["name"])
+    )
+    factory = Factory.objects.create(**data)
+    user.factory = factory
+    user.save()
+
+
+def create_with_serializer(data):
+    serializer = FactorySerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+
+class Command(BaseCommand):
+    """Django command to compare factory creation with and without password hashing"""
+
+    help = (
+        "Print factories created per second with a hashed default password "
+        "and with FactorySerializer. Nothing is kept in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100)
+
+    def handle(self, *args, **options):
+        rates = {}
+        for name, create in (
+            ("hashed password", create_with_password),
+            ("FactorySerializer", create_with_serializer),
+        ):
+            with transaction.atomic():
+                begin = time.perf_counter()
+                for i in range(options["count"]):
+                    create(factory_data(i))
+                elapsed = time.perf_counter() - begin
+                transaction.set_rollback(True)
+            rates[name] = options["count"] / elapsed
+            self.stdout.write(f"{name}: {rates[name]:.0f} factories/s")
+        speedup = rates["FactorySerializer"] / rates["hashed password"]
+        self.stdout.write(self.style.SUCCESS(f"{speedup:.1f}x faster"))
@@ -0,0 +1,86 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    """Django command to time concurrent logins against the token endpoint"""
+
+    help = (
+        "Post --logins token requests on --concurrency threads for temporary "
+        "users and print the throughput and latencies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=500)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="Log every user in once before timing, filling the credentials cache",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        # one hash with the current hasher profile for all users
+        password = make_password(PASSWORD)
+        emails = [f"login-benchmark-{i}@factory.com" for i in range(options["users"])]
+        User.objects.bulk_create(
+            User(email=email, surname="Benchmark", password=password)
+            for email in emails
+        )
+        try:
+            if options["warm"]:
+                for email in emails:
+                    self.login(email)
+            begin = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                results = list(
+                    pool.map(
+                        lambda i: self.login(emails[i % len(emails)]),
+                        range(options["logins"]),
+                    )
+                )
+            elapsed = time.perf_counter() - begin
+        finally:
+            User.objects.filter(email__in=emails).delete()
+
+        timings = sorted(timing for _, timing in results)
+        failed = sum(status != 200 for status, _ in results)
+        self.stdout.write(
+            f"{settings.PASSWORD_HASHERS[0]} cost {settings.PASSWORD_HASHER_COST or 'default'}, "
+            f"credentials cache {settings.CREDENTIALS_CACHE_TIMEOUT}s"
+        )
+        self.stdout.write(
+            f"median {statistics.median(timings) * 1000:.0f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.0f} ms"
+        )
+        message = f"{len(results) / elapsed:.1f} logins/s"
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{message}, {failed} failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def login(self, email):
+        """Return the status and duration of a token request"""
+        try:
+            begin = time.perf_counter()
+            res = Client(HTTP_HOST="localhost").post(
+                reverse("user:token_obtain_pair"),
+                {"email": email, "password": PASSWORD},
+            )
+            return res.status_code, time.perf_counter() - begin
+        finally:
+            connections.close_all()
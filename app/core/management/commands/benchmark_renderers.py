@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONRenderer, orjson
+
+
+def factory_payload(count, equipments=10):
+    """Return a list shaped like the factory list response"""
+    return [
+        {
+            "id": i,
+            "name": f"Factory {i}",
+            "address": "Organize Sanayi Bölgesi",
+            "city": "İzmir",
+            "country": "Türkiye",
+            "user_id": i,
+            "user_email": f"user{i}@factory.com",
+            "all_users": [
+                {"id": i, "email": f"user{i}@factory.com", "name": "Default"}
+            ],
+            "equipments": [
+                {
+                    "id": i * equipments + j,
+                    "name": f"Equipment {i}-{j}",
+                    "description": "Description",
+                    "price": j * 10.25,
+                    "date": "2021-01-01",
+                    "status": j % 2 == 0,
+                }
+                for j in range(equipments)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    """Django command to compare the stock and orjson JSON renderers"""
+
+    help = "Print median render timings of JSONRenderer and ORJSONRenderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed")
+        data = factory_payload(options["items"])
+        outputs = {}
+        medians = {}
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            name = type(renderer).__name__
+            timings = []
+            for _ in range(options["repeat"]):
+                begin = time.perf_counter()
+                outputs[name] = renderer.render(data)
+                timings.append(time.perf_counter() - begin)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(
+                f"{name}: median {medians[name] * 1000:.2f} ms "
+                f"for {len(outputs[name]) / 1e6:.1f} MB"
+            )
+        if outputs["JSONRenderer"] != outputs["ORJSONRenderer"]:
+            raise CommandError("The renderers produced different output")
+        speedup = medians["JSONRenderer"] / medians["ORJSONRenderer"]
+        self.stdout.write(
+            self.style.SUCCESS(f"Identical output, {speedup:.1f}x faster")
+        )
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.keys import public_jwk
+
+
+class Command(BaseCommand):
+    """Django command to create a private key for signing tokens"""
+
+    help = (
+        "Write a PEM private key for JWT_PRIVATE_KEY_FILE and its public key "
+        "next to it, for JWT_PUBLIC_KEY_FILES once it is rotated out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--algorithm", choices=["RS256", "EdDSA"], default="RS256")
+
+    def handle(self, *args, **options):
+        try:
+            from cryptography.hazmat.primitives import serialization
+            from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+        except ImportError:
+            raise CommandError("cryptography is not installed")
+
+        if options["algorithm"] == "EdDSA":
+            key = ed25519.Ed25519PrivateKey.generate()
+        else:
+            key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        public = key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        path = options["path"]
+        try:
+            # readable by the owner only, never overwrite a key in use
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            raise CommandError(f"{path} already exists")
+        with os.fdopen(fd, "wb") as file:
+            file.write(private)
+        with open(f"{path}.pub", "wb") as file:
+            file.write(public)
+        kid = public_jwk(key.public_key(), options["algorithm"])["kid"]
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path} and {path}.pub, kid {kid}"))
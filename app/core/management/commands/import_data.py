@@ -0,0 +1,181 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.cache import invalidate_factories
+from core.models import (
+    Factory,
+    FactoryStats,
+    equipment_changes,
+    group_changes,
+)
+from core.serializers import BulkPrimaryKeyRelatedField
+from equipment.serializers import EquipmentSerializer, PropertySerializer
+from factory.serializers import FactorySerializer, default_user_fields
+
+
+class ImportEquipmentSerializer(EquipmentSerializer):
+    """Equipment serializer taking the factory from the imported row"""
+
+    factory = BulkPrimaryKeyRelatedField(queryset=Factory.objects.all())
+
+    class Meta(EquipmentSerializer.Meta):
+        fields = EquipmentSerializer.Meta.fields + ("factory",)
+
+
+SERIALIZERS = {
+    "factory": FactorySerializer,
+    "equipment": ImportEquipmentSerializer,
+    "property": PropertySerializer,
+}
+
+
+def read_rows(file, file_format):
+    """Yield (line number, row) pairs from a csv or ndjson file"""
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            # empty cells fall back to the serializer defaults
+            yield reader.line_num, {
+                key: value for key, value in row.items() if key and value != ""
+            }
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"Line {line_number}: {exc}")
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    """Django command to import factories, equipment or properties from a file"""
+
+    help = (
+        "Stream a csv or ndjson file of factories, equipment or properties "
+        "through the API serializers and bulk insert it chunk by chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(SERIALIZERS))
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Report and skip invalid rows instead of stopping",
+        )
+
+    def handle(self, *args, **options):
+        model = options["model"]
+        file_format = options["format"] or self.guess_format(options["path"])
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        imported = skipped = 0
+        start = time.monotonic()
+        with open(options["path"], newline="", encoding="utf-8") as file:
+            rows = read_rows(file, file_format)
+            for chunk in chunked(rows, options["chunk_size"]):
+                serializer, invalid = self.validate(model, chunk)
+                if invalid and not options["skip_invalid"]:
+                    raise CommandError(
+                        f"Invalid rows, {imported} rows imported before line {chunk[0][0]}"
+                    )
+                if invalid:
+                    chunk = [item for item in chunk if item[0] not in invalid]
+                    skipped += len(invalid)
+                    serializer, invalid = self.validate(model, chunk)
+                    if invalid:
+                        raise CommandError("Rows became invalid after skipping others")
+
+                with transaction.atomic():
+                    self.save(model, serializer)
+                imported += len(serializer.validated_data)
+                rate = imported / max(time.monotonic() - start, 1e-6)
+                self.stdout.write(f"{imported} rows imported ({rate:.0f} rows/s)")
+
+        message = f"Imported {imported} {model} rows"
+        if skipped:
+            message += f", skipped {skipped} invalid rows"
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def guess_format(self, path):
+        """Return the file format matching the extension of path"""
+        if path.endswith(".csv"):
+            return "csv"
+        if path.endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+        raise CommandError("Can't guess the file format, pass --format")
+
+    def validate(self, model, chunk):
+        """Return the serializer of chunk and the lines of invalid rows"""
+        serializer = SERIALIZERS[model](data=[row for _, row in chunk], many=True)
+        if serializer.is_valid():
+            return serializer, set()
+        invalid = set()
+        for (line, _), errors in zip(chunk, serializer.errors):
+            if errors:
+                self.stderr.write(f"Line {line}: {json.dumps(errors)}")
+                invalid.add(line)
+        return serializer, invalid
+
+    def save(self, model, serializer):
+        """Bulk insert the validated rows of a chunk"""
+        if model == "factory":
+            self.save_factories(serializer.validated_data)
+            return
+        if model == "equipment":
+            changes = group_changes(
+                (equipment.factory_id, equipment_changes(equipment))
+                for equipment in serializer.save()
+            )
+        else:
+            changes = group_changes(
+                (prop.equipment.factory_id, {"property_count": 1})
+                for prop in serializer.save()
+            )
+        FactoryStats.objects.add(changes)
+        Factory.objects.filter(pk__in=changes).bump_version()
+        invalidate_factories(changes)
+
+    def save_factories(self, validated_data):
+        """Bulk insert factories with a default user each
+
+        The users get unusable passwords, staff set them with the user
+        update endpoint.
+        """
+        factories = Factory.objects.bulk_create(
+            [Factory(**attrs) for attrs in validated_data]
+        )
+        User = get_user_model()
+        User.objects.bulk_create(
+            [
+                User(
+                    factory=factory,
+                    password=make_password(None),
+                    **default_user_fields(factory.name),
+                )
+                for factory in factories
+            ]
+        )
+        invalidate_factories([])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import RevokedToken
+
+
+class Command(BaseCommand):
+    """Django command to delete the revoked refresh tokens that expired"""
+
+    help = "Delete revoked refresh tokens past their expiry, run it daily."
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens"))
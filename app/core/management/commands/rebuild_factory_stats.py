@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import invalidate_factories
+from core.models import Factory, FactoryStats
+
+
+class Command(BaseCommand):
+    """Django command to rebuild or check the factory statistics rollups"""
+
+    help = (
+        "Recompute the per-factory statistics rollups from the equipment and "
+        "property tables, or only report the stale ones with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report stale rollups and exit with an error instead of rebuilding",
+        )
+        parser.add_argument(
+            "--factory",
+            type=int,
+            action="append",
+            dest="factory_ids",
+            help="Rebuild only this factory, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            stale = FactoryStats.objects.find_stale()
+            for factory_id, field, stored, actual in stale:
+                self.stderr.write(
+                    f"Factory {factory_id}: {field} is {stored}, expected {actual}"
+                )
+            if stale:
+                raise CommandError(f"{len(stale)} stale rollup values")
+            self.stdout.write(self.style.SUCCESS("Factory stats are up to date"))
+            return
+        FactoryStats.objects.rebuild(options["factory_ids"])
+        factory_ids = options["factory_ids"]
+        if factory_ids is None:
+            factory_ids = Factory.objects.values_list("id", flat=True)
+        invalidate_factories(factory_ids)
+        self.stdout.write(self.style.SUCCESS("Factory stats rebuilt"))
@@ -0,0 +1,52 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db import pin_to_primary, replica_reads
+
+
+class ReplicaMiddleware:
+    """Let safe requests read from the database replicas
+
+    Successful writes pin their user to the primary for
+    settings.REPLICA_PIN_SECONDS, covering the replication lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = replica_reads.set(request.method in SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        if self.wrote(request, response):
+            pin_to_primary(request.user)
+        return response
+
+    async def __acall__(self, request):
+        token = replica_reads.set(request.method in SAFE_METHODS)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+        if self.wrote(request, response):
+            await sync_to_async(pin_to_primary)(request.user)
+        return response
+
+    def wrote(self, request, response):
+        """Return whether the request was a successful write by a user"""
+        # DRF sets the authenticated user on the wrapped request
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and getattr(request, "user", None) is not None
+        )
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-17 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_alter_equipment_factory"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "status"], name="equipment_factory_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "date"], name="equipment_factory_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("is_staff", True)),
+                fields=["factory"],
+                name="user_factory_staff_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "price"], name="equipment_factory_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "name"], name="equipment_factory_name_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0 on 2026-10-17 17:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_factory_stats(apps, schema_editor):
+    """Fill the rollups of the existing factories"""
+    Factory = apps.get_model("core", "Factory")
+    FactoryStats = apps.get_model("core", "FactoryStats")
+    Equipment = apps.get_model("core", "Equipment")
+    Property = apps.get_model("core", "Property")
+    stats = {
+        factory_id: FactoryStats(factory_id=factory_id)
+        for factory_id in Factory.objects.values_list("id", flat=True)
+    }
+    for row in Equipment.objects.values("factory_id").annotate(
+        equipment_count=models.Count("id"),
+        active_equipment_count=models.Count("id", filter=models.Q(status=True)),
+        total_price=models.Sum("price"),
+    ):
+        rollup = stats[row.pop("factory_id")]
+        for field, value in row.items():
+            setattr(rollup, field, value)
+    for factory_id, count in Property.objects.values_list(
+        "equipment__factory_id"
+    ).annotate(models.Count("id")):
+        stats[factory_id].property_count = count
+    FactoryStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_equipment_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FactoryStats",
+            fields=[
+                (
+                    "factory",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="core.factory",
+                    ),
+                ),
+                ("equipment_count", models.IntegerField(default=0)),
+                ("active_equipment_count", models.IntegerField(default=0)),
+                ("total_price", models.FloatField(default=0)),
+                ("property_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(fields=["date"], name="equipment_date_idx"),
+        ),
+        migrations.RunPython(build_factory_stats, migrations.RunPython.noop),
+    ]
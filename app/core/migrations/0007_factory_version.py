@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_factory_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="factory",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
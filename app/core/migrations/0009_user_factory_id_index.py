@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-17 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0008_revoked_token"),
+    ]
+
+    operations = [
+        # create the composite index before dropping the one it replaces
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["factory", "id"], name="user_factory_id_idx"),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="factory",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="core.factory",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0009_user_factory_id_index"),
+    ]
+
+    operations = [
+        # create the new indexes before dropping the ones they replace
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "date", "id"], name="equipment_factory_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["factory", "price", "id"], name="equipment_factory_price_id_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="equipment",
+            name="equipment_factory_date_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="equipment",
+            name="equipment_factory_price_idx",
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import math
+from collections import Counter, defaultdict
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -26,6 +30,14 @@ class UserManager(BaseUserManager):
 
         return user
 
+    def visible_to(self, user):
+        """Return the users user may list, from its flags and factory only"""
+        if user.is_superuser:
+            return self.get_queryset()
+        if user.is_staff:
+            return self.filter(factory_id=user.factory_id)
+        return self.filter(id=user.id)
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model that suppors using email instead of username"""
@@ -37,13 +49,30 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
 
     factory = models.ForeignKey(
-        "Factory", on_delete=models.CASCADE, blank=True, null=True
+        "Factory",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        # covered by user_factory_id_idx
+        db_index=False,
     )
 
     objects = UserManager()
 
     USERNAME_FIELD = "email"
 
+    class Meta:
+        indexes = [
+            # factory admins are a few rows per factory
+            models.Index(
+                fields=["factory"],
+                condition=models.Q(is_staff=True),
+                name="user_factory_staff_idx",
+            ),
+            # a factory's users in id order, as the listing pages them
+            models.Index(fields=["factory", "id"], name="user_factory_id_idx"),
+        ]
+
 
 class Equipment(models.Model):
     """Equipment object"""
@@ -57,6 +86,22 @@ class Equipment(models.Model):
     date = models.DateField()
     status = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["factory", "status"], name="equipment_factory_status_idx"
+            ),
+            # id breaks ties in the list ordering and pagination
+            models.Index(
+                fields=["factory", "date", "id"], name="equipment_factory_date_id_idx"
+            ),
+            models.Index(
+                fields=["factory", "price", "id"], name="equipment_factory_price_id_idx"
+            ),
+            models.Index(fields=["factory", "name"], name="equipment_factory_name_idx"),
+            models.Index(fields=["date"], name="equipment_date_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -72,6 +117,59 @@ class Property(models.Model):
         return self.name
 
 
+def factory_prefetches(users=True, equipments=True):
+    """Return the prefetch lookups used to embed users and equipments"""
+    lookups = []
+    if users:
+        lookups.append(
+            models.Prefetch("user_set", queryset=User.objects.order_by("id"))
+        )
+    if equipments:
+        lookups.append(
+            models.Prefetch("equipments", queryset=Equipment.objects.order_by("id"))
+        )
+    return lookups
+
+
+class FactoryQuerySet(models.QuerySet):
+    def with_related(self, users=True, equipments=True):
+        """Prefetch the users and equipments embedded in factory responses"""
+        return self.prefetch_related(*factory_prefetches(users, equipments))
+
+    def bump_version(self):
+        """Mark the responses of the factories as changed"""
+        return self.update(version=models.F("version") + 1)
+
+    def version(self):
+        """Return a value that changes with any change to the factories"""
+        return tuple(self.aggregate(*self.version_aggregates()).values())
+
+    async def aversion(self):
+        """Async version()"""
+        return tuple((await self.aaggregate(*self.version_aggregates())).values())
+
+    @staticmethod
+    def version_aggregates():
+        # ids only grow, so added or removed factories change the id sum
+        return models.Count("id"), models.Sum("id"), models.Sum("version")
+
+    def stats(self):
+        """Return the rollup statistics and equipment dates of the factories"""
+        dates = Equipment.objects.filter(factory=models.OuterRef("pk")).values("date")
+        return self.values(
+            **{
+                field: Coalesce(
+                    f"stats__{field}",
+                    0,
+                    output_field=FactoryStats._meta.get_field(field),
+                )
+                for field in STATS_FIELDS
+            },
+            first_date=models.Subquery(dates.order_by("date")[:1]),
+            last_date=models.Subquery(dates.order_by("-date")[:1]),
+        )
+
+
 class Factory(models.Model):
     """Factory object"""
 
@@ -79,10 +177,167 @@ class Factory(models.Model):
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=255)
     country = models.CharField(max_length=255)
+    # bumped by every change to the factory responses, used for ETags
+    version = models.PositiveIntegerField(default=0)
+
+    objects = FactoryQuerySet.as_manager()
+
+    @property
+    def first_user(self):
+        """Return the first user of this factory, reusing prefetched users"""
+        if "user_set" in getattr(self, "_prefetched_objects_cache", {}):
+            users = self.user_set.all()
+            return users[0] if users else None
+        return self.user_set.order_by("id").first()
 
     @property
     def first_user_id(self):
-        return self.user_set.first().id
+        user = self.first_user
+        return user.id if user is not None else None
 
     def __str__(self):
         return self.name
+
+
+STATS_FIELDS = (
+    "equipment_count",
+    "active_equipment_count",
+    "total_price",
+    "property_count",
+)
+
+
+def equipment_changes(equipment, sign=1):
+    """Return the rollup changes of adding (sign=-1: removing) an equipment"""
+    return Counter(
+        equipment_count=sign,
+        active_equipment_count=sign if equipment.status else 0,
+        total_price=sign * equipment.price,
+    )
+
+
+def group_changes(changes):
+    """Sum (factory id, Counter of changes) pairs per factory"""
+    grouped = defaultdict(Counter)
+    for factory_id, factory_changes in changes:
+        grouped[factory_id].update(factory_changes)
+    return grouped
+
+
+def compute_factory_stats(equipments=None):
+    """Return {factory id: stats} computed from the equipment and properties"""
+    if equipments is None:
+        equipments, properties = Equipment.objects.all(), Property.objects.all()
+    else:
+        properties = Property.objects.filter(equipment__in=equipments)
+    stats = defaultdict(lambda: dict.fromkeys(STATS_FIELDS, 0))
+    for row in equipments.values("factory_id").annotate(
+        equipment_count=models.Count("id"),
+        active_equipment_count=models.Count("id", filter=models.Q(status=True)),
+        total_price=models.Sum("price"),
+    ):
+        stats[row.pop("factory_id")].update(row)
+    for factory_id, count in properties.values_list("equipment__factory_id").annotate(
+        models.Count("id")
+    ):
+        stats[factory_id]["property_count"] = count
+    return stats
+
+
+class FactoryStatsManager(models.Manager):
+    def add(self, changes_by_factory):
+        """Apply {factory id: Counter of changes} with one update per factory"""
+        for factory_id, changes in changes_by_factory.items():
+            updates = {
+                field: models.F(field) + value
+                for field, value in changes.items()
+                if value
+            }
+            if not updates:
+                continue
+            if not self.filter(factory_id=factory_id).update(**updates):
+                self.get_or_create(factory_id=factory_id)
+                self.filter(factory_id=factory_id).update(**updates)
+
+    def rebuild(self, factory_ids=None):
+        """Recompute the rollups from scratch"""
+        factories = Factory.objects.all()
+        equipments = None
+        if factory_ids is not None:
+            factories = factories.filter(id__in=factory_ids)
+            equipments = Equipment.objects.filter(factory_id__in=factory_ids)
+        stats = compute_factory_stats(equipments)
+        with transaction.atomic():
+            self.filter(factory__in=factories).delete()
+            self.bulk_create(
+                self.model(factory_id=factory_id, **stats[factory_id])
+                for factory_id in factories.values_list("id", flat=True)
+            )
+
+    def totals(self):
+        """Sum the rollups of all factories, with the dates of all equipment
+
+        The dates take a second query on Equipment. Unlike the sums they
+        can't be kept with the deltas of add(): deleting the earliest
+        equipment would need a rescan of the factory on every write.
+        """
+        return {
+            **self.aggregate(
+                **{field: models.Sum(field, default=0) for field in STATS_FIELDS}
+            ),
+            **Equipment.objects.aggregate(
+                first_date=models.Min("date"), last_date=models.Max("date")
+            ),
+        }
+
+    def find_stale(self):
+        """Return (factory id, field, stored, actual) for stale rollups"""
+        stats = compute_factory_stats()
+        stored = {
+            row.pop("factory_id"): row
+            for row in self.values("factory_id", *STATS_FIELDS)
+        }
+        mismatches = []
+        for factory_id in Factory.objects.values_list("id", flat=True):
+            actual = stats[factory_id]
+            rollup = stored.get(factory_id, dict.fromkeys(STATS_FIELDS, 0))
+            for field in STATS_FIELDS:
+                stored_value, actual_value = rollup[field] or 0, actual[field] or 0
+                if field == "total_price":
+                    # summed in a different order, the float totals can drift
+                    stale = not math.isclose(
+                        stored_value, actual_value, rel_tol=1e-9, abs_tol=1e-6
+                    )
+                else:
+                    stale = stored_value != actual_value
+                if stale:
+                    mismatches.append((factory_id, field, rollup[field], actual[field]))
+        return mismatches
+
+
+class FactoryStats(models.Model):
+    """Rollup of the equipment statistics of a factory"""
+
+    factory = models.OneToOneField(
+        "Factory", primary_key=True, related_name="stats", on_delete=models.CASCADE
+    )
+    equipment_count = models.IntegerField(default=0)
+    active_equipment_count = models.IntegerField(default=0)
+    total_price = models.FloatField(default=0)
+    property_count = models.IntegerField(default=0)
+
+    objects = FactoryStatsManager()
+
+    def __str__(self):
+        return f"Stats of factory {self.factory_id}"
+
+
+class RevokedToken(models.Model):
+    """Refresh token that was rotated or blacklisted, see user.tokens"""
+
+    jti = models.CharField(max_length=255, primary_key=True)
+    # rows are purged once the token expired, see purge_revoked_tokens
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
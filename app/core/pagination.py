@@ -0,0 +1,122 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class StableOrderingFilter(OrderingFilter):
+    """OrderingFilter breaking ties on id
+
+    Unless one of the ordering fields is unique, id is appended so rows
+    with equal values always come in the same order.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering is None:
+            return ordering
+        opts = queryset.model._meta
+        for field in ordering:
+            try:
+                if opts.get_field(field.lstrip("-")).unique:
+                    return ordering
+            except FieldDoesNotExist:
+                pass
+        return [*ordering, "id"]
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on id, enabled when the client sends ?page_size=
+
+    The cursor holds the values of every ordering field of the last row,
+    the next page starts after them with a row comparison. Orderings have
+    to be unique, see StableOrderingFilter, pages then never skip rows
+    with an offset.
+    """
+
+    ordering = "id"
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset() filtering on all the fields
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.position_filter(current_position, reverse))
+
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def position_filter(self, position, reverse):
+        """Return the Q of the rows after position in the ordering"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        conditions = []
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") != reverse else "gt"
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": value}))
+            equal[name] = value
+        # the bound on the first field lets an index start the range scan
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") != reverse else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & reduce(
+            or_, conditions
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
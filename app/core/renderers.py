@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer using orjson when installed, with JSONRenderer's output
+
+    Dates, decimals and other non-JSON types still go through the DRF
+    encoder. Indented or ASCII-only output, and data orjson rejects such
+    as integers over 64 bits, are rendered by JSONRenderer. Differences
+    left: floats written with an exponent (1e16 instead of 1e+16), and
+    NaN or infinity rendered as null instead of raising.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type or "", renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes the line and paragraph separators for javascript
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
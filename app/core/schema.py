@@ -0,0 +1,39 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from drf_spectacular.openapi import AutoSchema as BaseAutoSchema
+from drf_spectacular.utils import OpenApiParameter
+
+from core.serializers import DynamicFieldsMixin
+
+
+class AutoSchema(BaseAutoSchema):
+    """Document the ?fields= and ?expand= parameters of dynamic serializers"""
+
+    def get_override_parameters(self):
+        parameters = super().get_override_parameters()
+        if self.method != "GET":
+            return parameters
+        serializer = self.get_response_serializers()
+        if not isinstance(serializer, DynamicFieldsMixin):
+            return parameters
+        parameters = parameters + [
+            OpenApiParameter(
+                "fields", str, description="Comma separated fields to return"
+            )
+        ]
+        expandable = getattr(serializer.Meta, "expandable_fields", ())
+        if expandable:
+            parameters.append(
+                OpenApiParameter(
+                    "expand",
+                    str,
+                    description="Comma separated fields to embed, one of: "
+                    + ", ".join(expandable),
+                )
+            )
+        return parameters
+
+
+class JWTScheme(SimpleJWTScheme):
+    """Document the project's JWT authentication as a bearer token"""
+
+    target_class = "user.authentication.JWTAuthentication"
@@ -0,0 +1,246 @@
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.validators import UniqueValidator
+
+
+def split_param(value):
+    """Split a comma separated query parameter into a set of names"""
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class DynamicFieldsMixin:
+    """Honour the ?fields= and ?expand= query parameters on read requests
+
+    ?fields= limits the response to the given fields. Fields listed in
+    Meta.expandable_fields are only rendered when named in ?expand=.
+    Nested serializers keep their full set of fields.
+    """
+
+    def get_requested_fields(self):
+        """Return the (fields, expand) sets of the request, fields may be None"""
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return None, set()
+        if self.root not in (self, self.parent):
+            return None, set()
+        fields = request.query_params.get("fields")
+        expand = split_param(request.query_params.get("expand", ""))
+        return (split_param(fields) if fields else None), expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_requested_fields()
+        for name in getattr(self.Meta, "expandable_fields", ()):
+            if name not in expand:
+                fields.pop(name, None)
+        if requested is not None:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    fields.pop(name)
+        return fields
+
+
+def as_pk(value):
+    """Return value as an integer primary key, or None"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field resolving the values of a whole list in one query"""
+
+    def get_bulk_objects(self):
+        """Return the objects referenced by all items of the root list"""
+        if not hasattr(self, "_bulk_objects"):
+            pks = {
+                as_pk(item.get(self.field_name))
+                for item in self.root.initial_data
+                if isinstance(item, dict)
+            }
+            pks.discard(None)
+            self._bulk_objects = self.get_queryset().in_bulk(pks)
+        return self._bulk_objects
+
+    def to_internal_value(self, data):
+        pk = as_pk(data)
+        if not isinstance(self.root, serializers.ListSerializer) or pk is None:
+            return super().to_internal_value(data)
+        try:
+            return self.get_bulk_objects()[pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """List serializer writing with bulk queries and reporting per item errors
+
+    The uniqueness of unique_field is checked with one query for the whole
+    list instead of one query per item, unless the "on_conflict" context
+    asks for conflicts to be handled by the view. When updating, each item
+    must carry the id of one of the instances given to the serializer.
+    """
+
+    unique_field = "name"
+    batch_size = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = self.child.fields.get(self.unique_field)
+        if field is not None:
+            field.validators = [
+                validator
+                for validator in field.validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+
+    @property
+    def model(self):
+        return self.child.Meta.model
+
+    def to_internal_value(self, data):
+        try:
+            validated_data = super().to_internal_value(data)
+            errors = [{} for _ in validated_data]
+        except ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            validated_data, errors = None, exc.detail
+        items = [item if isinstance(item, dict) else {} for item in data]
+
+        instances = {}
+        if self.instance is not None:
+            instances = {instance.pk: instance for instance in self.instance}
+            seen_ids = set()
+            for item, item_errors in zip(items, errors):
+                if item.get("id") not in instances:
+                    item_errors["id"] = ["Not found."]
+                elif item["id"] in seen_ids:
+                    # the update would apply and count the row twice
+                    item_errors["id"] = ["Duplicate id in this request."]
+                else:
+                    seen_ids.add(item["id"])
+
+        for index, message in self.get_unique_errors(items).items():
+            errors[index].setdefault(self.unique_field, []).append(message)
+        if any(errors):
+            raise ValidationError(errors)
+
+        if instances:
+            for attrs, item in zip(validated_data, items):
+                attrs["id"] = item["id"]
+        return validated_data
+
+    def get_unique_errors(self, items):
+        """Return {index: message} for items whose unique field is taken"""
+        errors = {}
+        seen = {}
+        for index, item in enumerate(items):
+            value = item.get(self.unique_field)
+            if value is None:
+                continue
+            if value in seen:
+                errors[index] = f"Duplicate {self.unique_field} in this request."
+            else:
+                seen[value] = index
+        if not seen or self.context.get("on_conflict", "error") != "error":
+            return errors
+
+        taken = self.model.objects.filter(
+            **{f"{self.unique_field}__in": list(seen)}
+        ).values_list("pk", self.unique_field)
+        for pk, value in taken:
+            index = seen[value]
+            if items[index].get("id") != pk:
+                errors[index] = (
+                    f"{self.model._meta.verbose_name} with this "
+                    f"{self.unique_field} already exists."
+                )
+        return errors
+
+    def create(self, validated_data):
+        """Insert all items with bulk_create in one transaction"""
+        with transaction.atomic():
+            return self.model.objects.bulk_create(
+                [self.model(**attrs) for attrs in validated_data],
+                batch_size=self.batch_size,
+            )
+
+    def update(self, instances, validated_data):
+        """Save all items with bulk_update in one transaction"""
+        instances = {instance.pk: instance for instance in instances}
+        updated = []
+        fields = set()
+        for attrs in validated_data:
+            instance = instances[attrs.pop("id")]
+            for attr, value in attrs.items():
+                setattr(instance, attr, value)
+            fields.update(attrs)
+            updated.append(instance)
+        if fields:
+            with transaction.atomic():
+                self.model.objects.bulk_update(
+                    updated, fields, batch_size=self.batch_size
+                )
+        return updated
+
+
+def iso_date(value):
+    """Represent a date like serializers.DateField"""
+    return value.isoformat() if value else None
+
+
+class ValuesSerializer:
+    """Read-only serializer of many objects built from .values() rows
+
+    Mirrors the output of a ModelSerializer without instantiating models
+    or calling a to_representation per field. `columns` maps the plain
+    output fields to their column, `converters` holds the conversions the
+    mirrored fields apply, and add_relations() fills the nested fields.
+    """
+
+    columns = {}
+    converters = {}
+
+    def __init__(self, field_names):
+        self.field_names = list(field_names)
+
+    def get_queryset(self, queryset):
+        """Return the rows of queryset with the columns the output needs"""
+        # the pagination reads the ordering columns from the rows
+        ordering = [name.lstrip("-") for name in queryset.query.order_by]
+        columns = {
+            "id",
+            *ordering,
+            *(self.columns[name] for name in self.field_names if name in self.columns),
+        }
+        return queryset.prefetch_related(None).values(*columns)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        data = []
+        for row in rows:
+            item = {}
+            for name in self.field_names:
+                value = row.get(self.columns.get(name))
+                converter = self.converters.get(name)
+                item[name] = (
+                    converter(value) if converter and value is not None else value
+                )
+            data.append(item)
+        self.add_relations(rows, data)
+        return data
+
+    def add_relations(self, rows, data):
+        """Fill the nested fields of data, rows[i] is the row of data[i]"""
+
+    def group_by(self, queryset, key):
+        """Return {key: [rows]} for the rows of queryset"""
+        groups = {}
+        for row in queryset:
+            groups.setdefault(row.pop(key), []).append(row)
+        return groups
@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Factory, Equipment
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    """Test the response cache of the read endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        self.equipment = Equipment.objects.create(
+            factory=self.factory,
+            name="Equipment",
+            description="Description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.ru = get_user_model().objects.create_user(
+            email="ru@test.com", password="testpass", factory=self.factory
+        )
+        self.client = APIClient()
+
+    def test_repeated_reads_skip_the_database(self):
+        """Test that a repeated read is served from the cache"""
+        self.client.force_authenticate(self.su)
+        url = reverse("factory:detail", args=[self.factory.id])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_equipment_write_invalidates_factory_responses(self):
+        """Test that an equipment update invalidates the factory it belongs to"""
+        self.client.force_authenticate(self.ru)
+        list_url = reverse("equipment:list", args=[self.factory.id])
+        factories_url = reverse("factory:list")
+        self.client.get(list_url)
+        self.client.get(factories_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("equipment:update", args=[self.equipment.id]),
+                {"name": "Renamed"},
+            )
+        self.assertEqual(self.client.get(list_url).data[0]["name"], "Renamed")
+        res = self.client.get(factories_url)
+        self.assertEqual(res.data[0]["equipments"][0]["name"], "Renamed")
+
+    def test_other_factory_write_keeps_cached_response(self):
+        """Test that writes to another factory leave the cached response"""
+        other = Factory.objects.create(
+            name="Other", address="Address", city="City", country="Country"
+        )
+        self.client.force_authenticate(self.su)
+        url = reverse("factory:detail", args=[self.factory.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("factory:update", args=[other.id]), {"city": "X"})
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_factory_users_do_not_share_staff_responses(self):
+        """Test that the cache is keyed by the scope of the user"""
+        Factory.objects.create(
+            name="Other", address="Address", city="City", country="Country"
+        )
+        self.client.force_authenticate(self.su)
+        self.assertEqual(len(self.client.get(reverse("factory:list")).data), 2)
+        self.client.force_authenticate(self.ru)
+        self.assertEqual(len(self.client.get(reverse("factory:list")).data), 1)
+
+    def test_permissions_checked_before_cache(self):
+        """Test that cached responses are not served to other factories"""
+        self.client.force_authenticate(self.su)
+        url = reverse("equipment:list", args=[self.factory.id])
+        self.client.get(url)
+        other = Factory.objects.create(
+            name="Other", address="Address", city="City", country="Country"
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="other@test.com", password="testpass", factory=other
+            )
+        )
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_update_invalidates_me(self):
+        """Test that updating a user invalidates their cached profile"""
+        self.client.force_authenticate(self.ru)
+        self.client.get(reverse("user:me"))
+        self.client.force_authenticate(self.su)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("user:update", args=[self.ru.id]), {"surname": "Renamed"}
+            )
+        self.ru.refresh_from_db()
+        self.client.force_authenticate(self.ru)
+        self.assertEqual(self.client.get(reverse("user:me")).data["surname"], "Renamed")
@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.models import Factory, FactoryStats, Equipment, Property, RevokedToken
+
+
+class ImportDataCommandTests(TestCase):
+    """Test the import_data command"""
+
+    def write_file(self, suffix, content):
+        """Write content to a temporary file and return its path"""
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_data(self, *args, **kwargs):
+        out = StringIO()
+        call_command("import_data", *args, stdout=out, stderr=StringIO(), **kwargs)
+        return out.getvalue()
+
+    def test_import_factories_csv(self):
+        """Test that factories are imported with their default users"""
+        path = self.write_file(
+            ".csv",
+            "name,address,city,country\n"
+            + "".join(f"Factory {i},Address,City,Country\n" for i in range(5)),
+        )
+        out = self.import_data("factory", path, chunk_size=2)
+        self.assertIn("Imported 5 factory rows", out)
+        self.assertEqual(Factory.objects.count(), 5)
+        user = get_user_model().objects.get(factory__name="Factory 3")
+        self.assertTrue(user.is_staff)
+        self.assertFalse(user.has_usable_password())
+
+    def test_import_equipment_ndjson(self):
+        """Test importing equipment into existing factories"""
+        factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        rows = [
+            {
+                "name": f"Equipment {i}",
+                "description": "Description",
+                "price": 10.5,
+                "date": "2021-01-01",
+                "factory": factory.id,
+            }
+            for i in range(3)
+        ]
+        path = self.write_file(".ndjson", "\n".join(map(json.dumps, rows)) + "\n")
+        self.import_data("equipment", path)
+        self.assertEqual(factory.equipments.count(), 3)
+
+    def test_import_invalid_rows_stops(self):
+        """Test that invalid rows stop the import by default"""
+        factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        equipment = Equipment.objects.create(
+            factory=factory,
+            name="Equipment",
+            description="Description",
+            price=10.5,
+            date="2021-01-01",
+        )
+        path = self.write_file(
+            ".csv",
+            "name,description,equipment\n"
+            f"Capacity,Description,{equipment.id}\n"
+            f"Energy,Description,{equipment.id + 100}\n",
+        )
+        with self.assertRaises(CommandError):
+            self.import_data("property", path)
+        self.assertEqual(Property.objects.count(), 0)
+
+    def test_import_skip_invalid_rows(self):
+        """Test skipping invalid rows"""
+        factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        equipment = Equipment.objects.create(
+            factory=factory,
+            name="Equipment",
+            description="Description",
+            price=10.5,
+            date="2021-01-01",
+        )
+        path = self.write_file(
+            ".csv",
+            "name,description,equipment\n"
+            f"Capacity,Description,{equipment.id}\n"
+            f"Energy,Description,{equipment.id + 100}\n"
+            f"Capacity,Description,{equipment.id}\n",
+        )
+        out = self.import_data("property", path, skip_invalid=True)
+        self.assertIn("skipped 2 invalid rows", out)
+        self.assertEqual(
+            list(equipment.property_set.values_list("name", flat=True)), ["Capacity"]
+        )
+
+    def test_import_updates_factory_stats(self):
+        """Test that imported equipment and properties update the rollups"""
+        factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        path = self.write_file(
+            ".csv",
+            "factory,name,description,price,date,status\n"
+            f"{factory.id},Lathe,Description,10.5,2021-01-01,true\n"
+            f"{factory.id},Drill,Description,4.5,2021-02-01,false\n",
+        )
+        self.import_data("equipment", path)
+        path = self.write_file(
+            ".csv",
+            "name,description,equipment\n"
+            f"Capacity,Description,{Equipment.objects.get(name='Lathe').id}\n",
+        )
+        self.import_data("property", path)
+        stats = FactoryStats.objects.get(factory=factory)
+        self.assertEqual(stats.equipment_count, 2)
+        self.assertEqual(stats.active_equipment_count, 1)
+        self.assertEqual(stats.total_price, 15.0)
+        self.assertEqual(stats.property_count, 1)
+        self.assertEqual(FactoryStats.objects.find_stale(), [])
+
+
+class RebuildFactoryStatsCommandTests(TestCase):
+    """Test the rebuild_factory_stats command"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        equipment = Equipment.objects.create(
+            factory=self.factory,
+            name="Equipment",
+            description="Description",
+            price=10.5,
+            date="2021-01-01",
+        )
+        equipment.property_set.create(name="Capacity", description="Description")
+
+    def test_check_reports_stale_rollups(self):
+        """Test that rows written without the hooks are reported"""
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_factory_stats", check=True, stderr=err)
+        self.assertIn(
+            f"Factory {self.factory.id}: equipment_count is 0", err.getvalue()
+        )
+
+    def test_rebuild(self):
+        """Test rebuilding the rollups from the tables"""
+        call_command("rebuild_factory_stats", stdout=StringIO())
+        stats = FactoryStats.objects.get(factory=self.factory)
+        self.assertEqual(stats.equipment_count, 1)
+        self.assertEqual(stats.active_equipment_count, 1)
+        self.assertEqual(stats.total_price, 10.5)
+        self.assertEqual(stats.property_count, 1)
+        out = StringIO()
+        call_command("rebuild_factory_stats", check=True, stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+    def test_find_stale_tolerates_float_drift(self):
+        """Test that only the price total is compared with a tolerance"""
+        FactoryStats.objects.rebuild()
+        FactoryStats.objects.filter(factory=self.factory).update(
+            total_price=10.5 + 1e-12
+        )
+        self.assertEqual(FactoryStats.objects.find_stale(), [])
+        FactoryStats.objects.filter(factory=self.factory).update(property_count=2)
+        self.assertEqual(
+            FactoryStats.objects.find_stale(),
+            [(self.factory.id, "property_count", 2, 1)],
+        )
+
+
+class BenchmarkRenderersCommandTests(TestCase):
+    """Test the benchmark_renderers command"""
+
+    def test_identical_output(self):
+        """Test that both renderers are timed on the same payload"""
+        out = StringIO()
+        call_command("benchmark_renderers", items=10, repeat=1, stdout=out)
+        self.assertIn("ORJSONRenderer: median", out.getvalue())
+        self.assertIn("Identical output", out.getvalue())
+
+
+class BenchmarkFactoryCreateCommandTests(TestCase):
+    """Test the benchmark_factory_create command"""
+
+    def test_rolls_back(self):
+        """Test that both creation paths are timed and nothing is kept"""
+        out = StringIO()
+        call_command("benchmark_factory_create", count=2, stdout=out)
+        self.assertIn("hashed password:", out.getvalue())
+        self.assertIn("FactorySerializer:", out.getvalue())
+        self.assertFalse(Factory.objects.exists())
+
+
+class BenchmarkAccessPathsCommandTests(TestCase):
+    """Test the benchmark_access_paths command"""
+
+    def test_seed(self):
+        """Test that seeded equipment comes with up to date rollups"""
+        out = StringIO()
+        call_command(
+            "benchmark_access_paths", seed=10, factories=2, repeat=1, stdout=out
+        )
+        self.assertIn("median", out.getvalue())
+        self.assertEqual(FactoryStats.objects.count(), 2)
+        self.assertEqual(FactoryStats.objects.find_stale(), [])
+
+
+@override_settings(PASSWORD_HASHER_COST=1000)
+class BenchmarkLoginsCommandTests(TransactionTestCase):
+    """Test the benchmark_logins command"""
+
+    def test_logins(self):
+        """Test that the temporary users log in and are removed"""
+        out = StringIO()
+        call_command(
+            "benchmark_logins", logins=4, concurrency=2, users=2, warm=True, stdout=out
+        )
+        self.assertIn("logins/s", out.getvalue())
+        self.assertNotIn("failed", out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class PurgeRevokedTokensCommandTests(TestCase):
+    """Test the purge_revoked_tokens command"""
+
+    def test_purge(self):
+        """Test that only expired tokens are deleted"""
+        now = timezone.now()
+        RevokedToken.objects.create(jti="expired", expires_at=now - timedelta(days=1))
+        RevokedToken.objects.create(jti="live", expires_at=now + timedelta(days=1))
+        out = StringIO()
+        call_command("purge_revoked_tokens", stdout=out)
+        self.assertIn("Deleted 1 expired tokens", out.getvalue())
+        self.assertEqual(
+            list(RevokedToken.objects.values_list("jti", flat=True)), ["live"]
+        )
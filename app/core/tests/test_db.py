@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.cache import CachedResponseMixin, get_cache
+from core.db import replica_reads
+from core.middleware import ReplicaMiddleware
+from core.models import Factory
+from user.authentication import JWTAuthentication, get_revocation_cache
+
+
+class SQLitePragmaTests(TestCase):
+    """Test the pragmas applied to new SQLite connections"""
+
+    def pragmas(self, *names):
+        """Return the pragma values of a new connection"""
+        connection = connections.create_connection("default")
+        self.addCleanup(connection.close)
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        values = []
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f"PRAGMA {name}")
+                values.append(cursor.fetchone()[0])
+        return values
+
+    def test_pragmas_applied(self):
+        """Test that new connections get the default pragmas"""
+        # synchronous NORMAL and temp_store MEMORY
+        self.assertEqual(
+            self.pragmas("synchronous", "temp_store", "cache_size"), [1, 2, -20000]
+        )
+
+    @override_settings(SQLITE_PRAGMAS={"cache_size": -1000})
+    def test_configured_pragmas(self):
+        """Test that the pragmas come from the settings"""
+        self.assertEqual(self.pragmas("cache_size"), [-1000])
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(TestCase):
+    """Test the routing of reads to the database replicas"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_revocation_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+
+    def request(self, method, user=None, view=None):
+        """Run a request through ReplicaMiddleware, return the read database"""
+        used = []
+
+        def get_response(request):
+            request.user = user or self.user
+            if view:
+                view(request)
+            used.append(router.db_for_read(Factory))
+            return HttpResponse()
+
+        ReplicaMiddleware(get_response)(getattr(RequestFactory(), method)("/"))
+        return used[0]
+
+    def test_safe_requests_read_from_replicas(self):
+        """Test that GET requests read from a replica"""
+        self.assertEqual(self.request("get"), "replica1")
+        self.assertEqual(self.request("head"), "replica1")
+
+    def test_writes_read_from_primary(self):
+        """Test that unsafe requests read from the primary"""
+        self.assertEqual(self.request("post"), "default")
+        self.assertEqual(router.db_for_write(Factory), "default")
+
+    def test_reads_after_write_in_request_use_primary(self):
+        """Test that a write turns replica reads off for the request"""
+        self.assertEqual(
+            self.request("get", view=lambda request: router.db_for_write(Factory)),
+            "default",
+        )
+
+    def test_outside_requests_read_from_primary(self):
+        """Test that commands and tasks read from the primary"""
+        self.assertFalse(replica_reads.get())
+        self.assertEqual(router.db_for_read(Factory), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Test that reads stay on the primary without replicas"""
+        self.assertEqual(self.request("get"), "default")
+
+    def test_replicas_not_migrated(self):
+        """Test that migrations only run on the primary"""
+        self.assertFalse(router.allow_migrate("replica1", "core"))
+        self.assertTrue(router.allow_migrate("default", "core"))
+
+    def authenticated_get(self):
+        """Return the read database of a GET authenticated with a token"""
+        header = f"Bearer {AccessToken.for_user(self.user)}"
+
+        def authenticate(request):
+            request.META["HTTP_AUTHORIZATION"] = header
+            JWTAuthentication().authenticate(request)
+
+        # stateless, the user lookup would read from the missing replica
+        with override_settings(JWT_STATELESS_AUTH=True):
+            return self.request("get", view=authenticate)
+
+    def test_writer_pinned_to_primary(self):
+        """Test that a user who just wrote reads from the primary"""
+        self.assertEqual(self.authenticated_get(), "replica1")
+        self.request("post")
+        self.assertEqual(self.authenticated_get(), "default")
+
+    def test_failed_writes_not_pinned(self):
+        """Test that rejected writes keep the user on the replicas"""
+
+        def reject(request):
+            request.user = self.user
+            return HttpResponse(status=400)
+
+        ReplicaMiddleware(reject)(RequestFactory().post("/"))
+        self.assertEqual(self.authenticated_get(), "replica1")
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=60)
+    def test_cache_misses_read_from_primary(self):
+        """Test that responses about to be cached are read from the primary"""
+
+        class CachedView(CachedResponseMixin):
+            def get_cache_scopes(self):
+                return ["replica-test"]
+
+        def lookup(request):
+            view = CachedView()
+            view.request = Request(request)
+            view.request.accepted_media_type = "application/json"
+            if view.get_cached_response(view.request) is None:
+                get_cache().set(
+                    view.response_cache_key, (b"{}", "application/json", None)
+                )
+
+        self.assertEqual(self.request("get", view=lookup), "default")
+        self.assertEqual(self.request("get", view=lookup), "replica1")
@@ -0,0 +1,90 @@
+import json
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer, orjson
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class ORJSONRendererTests(SimpleTestCase):
+    """Test that the orjson renderer matches the stock JSON renderer"""
+
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_serializer_output(self):
+        """Test nested serializer containers, unicode and floats"""
+        data = ReturnList(
+            [
+                ReturnDict(
+                    {
+                        "id": 1,
+                        "name": "Fabrika İzmir – ağırlık",
+                        "price": 100.5,
+                        "ratio": 0.1,
+                        "status": True,
+                        "user_id": None,
+                        "equipments": [{"id": 2, "price": 3.0}],
+                    },
+                    serializer=None,
+                )
+            ],
+            serializer=None,
+        )
+        self.assertSameOutput(data)
+
+    def test_python_types(self):
+        """Test the types left to the DRF encoder"""
+        self.assertSameOutput(
+            {
+                "date": date(2021, 1, 1),
+                "datetime": datetime(2021, 1, 1, 12, 30, 15, 123456, timezone.utc),
+                "decimal": Decimal("10.50"),
+                1: "non string key",
+            }
+        )
+
+    def test_line_separators_escaped(self):
+        """Test the javascript line separators are escaped like the stdlib"""
+        self.assertSameOutput({"name": "a\u2028b\u2029c"})
+
+    def test_indent_falls_back(self):
+        """Test indented output is rendered by the stock renderer"""
+        self.assertSameOutput({"a": [1, 2]}, "application/json; indent=4")
+
+    def test_big_integers_fall_back(self):
+        """Test integers orjson can't encode"""
+        self.assertSameOutput({"a": 2**70})
+
+    def test_none(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser"""
+
+    def test_parse(self):
+        payload = {"name": "Fabrika", "items": [1, 2.5, None]}
+        stream = BytesIO(json.dumps(payload).encode())
+        self.assertEqual(ORJSONParser().parse(stream), payload)
+
+    def test_invalid_json(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"name": '))
+
+    def test_nan_rejected(self):
+        """Test that non standard constants are rejected like in strict mode"""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"price": NaN}'))
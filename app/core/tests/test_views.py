@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Equipment, Factory, FactoryStats
+
+
+class AsyncReadTests(TestCase):
+    """Test the read endpoints served through the ASGI handler"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        Equipment.objects.create(
+            factory=self.factory,
+            name="Equipment",
+            description="Description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        FactoryStats.objects.rebuild()
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.client = AsyncClient()
+        self.token = f"Bearer {AccessToken.for_user(self.su)}"
+
+    def get(self, url, data=None, **headers):
+        """Make an authenticated GET through the ASGI handler"""
+        return self.client.get(
+            url, data, headers={"Authorization": self.token, **headers}
+        )
+
+    async def test_matches_sync_responses(self):
+        """Test that the async views answer like the sync handler"""
+        sync_client = APIClient()
+        sync_client.force_authenticate(self.su)
+        urls = [
+            reverse("factory:list"),
+            reverse("factory:detail", args=[self.factory.id]),
+            reverse("equipment:list", args=[self.factory.id]),
+            reverse("user:me"),
+            reverse("user:list"),
+            reverse("user:detail", args=[self.su.id]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                res = await self.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                expected = await sync_to_async(sync_client.get)(url)
+                self.assertEqual(res.json(), expected.json())
+
+    async def test_not_modified(self):
+        """Test that a matching If-None-Match gets a 304"""
+        url = reverse("equipment:list", args=[self.factory.id])
+        etag = (await self.get(url))["ETag"]
+        res = await self.get(url, **{"If-None-Match": etag})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=60)
+    async def test_cached_response(self):
+        """Test that cached responses are served from the async path"""
+        url = reverse("factory:detail", args=[self.factory.id])
+        first = await self.get(url)
+        second = await self.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    async def test_stream(self):
+        """Test that the factory stream is an async iterator under ASGI"""
+        res = await self.get(reverse("factory:list"), {"stream": "true"})
+        self.assertTrue(res.is_async)
+        content = b"".join([chunk async for chunk in res.streaming_content])
+        self.assertIn(b'"name":"Factory"', content)
+
+    async def test_unauthenticated(self):
+        """Test that authentication runs before the async handler"""
+        res = await AsyncClient().get(reverse("factory:list"))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_other_methods_not_allowed(self):
+        """Test that methods without a handler are rejected"""
+        res = await self.client.post(
+            reverse("factory:list"), headers={"Authorization": self.token}
+        )
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
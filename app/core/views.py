@@ -0,0 +1,75 @@
+from asgiref.sync import sync_to_async
+from rest_framework.response import Response
+
+
+class ValuesListMixin:
+    """List with values_serializer_class, skipping model instances
+
+    The full serializer is still instantiated once for its field names,
+    so ?fields= and ?expand= apply to both.
+    """
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_serializer().fields
+        serializer = self.values_serializer_class(
+            name for name, field in fields.items() if not field.write_only
+        )
+        queryset = serializer.get_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
+
+
+class AsyncReadMixin:
+    """Serve GET from the async aget() handler
+
+    DRF views are sync only, this dispatches GET and HEAD to aget() on the
+    event loop under ASGI. Authentication, permissions and the other
+    methods run in the request's sync thread. Mixins define aget() calling
+    super().aget(), put this after them in the bases: it ends the chain by
+    running the generic view's get() in the request's sync thread.
+
+    The ORM work still runs one request at a time per sync thread, only
+    cache hits, 304s and the export stream stay on the event loop. ASGI
+    is opt-in for them, see app/asgi.py.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # authentication may look the user up
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            method = request.method.lower()
+            if method in ("get", "head"):
+                response = await self.aget(request, *args, **kwargs)
+            else:
+                if method in self.http_method_names:
+                    handler = getattr(self, method, self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        if isinstance(response, Response):
+            # CachedResponseMixin renders and stores it, keep that off the loop
+            response = await sync_to_async(self.finalize_response)(
+                request, response, *args, **kwargs
+            )
+        else:
+            response = self.finalize_response(request, response, *args, **kwargs)
+        self.response = response
+        return self.response
+
+    async def aget(self, request, *args, **kwargs):
+        return await sync_to_async(super().get)(request, *args, **kwargs)
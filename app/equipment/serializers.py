@@ -1,6 +1,14 @@
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 
 from core.models import Factory, Equipment, Property
+from core.serializers import (
+    DynamicFieldsMixin,
+    BulkListSerializer,
+    BulkPrimaryKeyRelatedField,
+    ValuesSerializer,
+    iso_date,
+)
 
 """
 
@@ -19,29 +27,111 @@ class Equipment(models.Model):
 """
 
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for equipment objects"""
 
+    properties = serializers.SerializerMethodField(
+        help_text="All properties of this equipment"
+    )
+
     class Meta:
         model = Equipment
-        fields = ("id", "name", "description", "price", "date", "status")
+        fields = ("id", "name", "description", "price", "date", "status", "properties")
         read_only_fields = ("id",)
+        expandable_fields = ("properties",)
+        list_serializer_class = BulkListSerializer
 
     def create(self, validated_data):
         """Create a new equipment"""
         return Equipment.objects.create(**validated_data)
-    
+
+    @extend_schema_field(list)
+    def get_properties(self, obj):
+        return [
+            {"id": prop.id, "name": prop.name, "description": prop.description}
+            for prop in obj.property_set.all()
+        ]
+
+
+class EquipmentValuesSerializer(ValuesSerializer):
+    """Read-only EquipmentSerializer for list responses"""
+
+    columns = {
+        "id": "id",
+        "name": "name",
+        "description": "description",
+        "price": "price",
+        "date": "date",
+        "status": "status",
+    }
+    converters = {"price": float, "date": iso_date}
+
+    def add_relations(self, rows, data):
+        if "properties" not in self.field_names:
+            return
+        properties = self.group_by(
+            Property.objects.filter(equipment_id__in=[row["id"] for row in rows])
+            .order_by("id")
+            .values("id", "name", "description", "equipment_id"),
+            "equipment_id",
+        )
+        for row, item in zip(rows, data):
+            item["properties"] = properties.get(row["id"], [])
+
+
+class EquipmentFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters filtering equipment lists"""
+
+    status = serializers.BooleanField(required=False)
+    date_after = serializers.DateField(
+        required=False, help_text="Earliest date, inclusive"
+    )
+    date_before = serializers.DateField(
+        required=False, help_text="Latest date, inclusive"
+    )
+    price_min = serializers.FloatField(required=False)
+    price_max = serializers.FloatField(required=False)
+    name = serializers.CharField(required=False, help_text="Name prefix")
+
+    LOOKUPS = {
+        "status": "status",
+        "date_after": "date__gte",
+        "date_before": "date__lte",
+        "price_min": "price__gte",
+        "price_max": "price__lte",
+        "name": "name__startswith",
+    }
+
+    def get_filters(self):
+        """Return the queryset filter kwargs of the validated parameters"""
+        return {self.LOOKUPS[key]: value for key, value in self.validated_data.items()}
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    """Serializer for the ids of a bulk delete"""
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class PropertyOutcomeSerializer(serializers.Serializer):
+    """Serializer for the outcome of one row of a bulk property create"""
+
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField()
+    status = serializers.ChoiceField(choices=["created", "updated", "skipped"])
 
 
-class PropertySerializer(serializers.ModelSerializer):
+class PropertySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for property objects"""
 
+    equipment = BulkPrimaryKeyRelatedField(queryset=Equipment.objects.all())
 
     class Meta:
         model = Property
         fields = ("id", "name", "description", "equipment")
         read_only_fields = ("id",)
+        list_serializer_class = BulkListSerializer
 
     def create(self, validated_data):
         """Create a new property"""
-        return Property.objects.create(**validated_data)
\ No newline at end of file
+        return Property.objects.create(**validated_data)
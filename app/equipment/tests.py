@@ -1,14 +1,24 @@
+import json
 # import uuid
-from django.test import TestCase
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
 
-from core.models import Factory, Equipment
+from core.models import Factory, FactoryStats, Equipment, Property
 from equipment.serializers import EquipmentSerializer
+from equipment.views import UpdateEquipmentAPIView
 
 
 CREATE_EQUIPMENT_URL = reverse("equipment:create")
@@ -78,6 +88,37 @@ class PrivateEquipmentAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 1)
 
+    def test_list_equipment_expand_properties(self):
+        """Test that properties are only embedded when expanded"""
+        self.equipment.property_set.create(
+            name="Property 1", description="Property 1 description"
+        )
+        url = reverse("equipment:list", args=[self.factory.id])
+        res = self.client.get(url)
+        self.assertNotIn("properties", res.data[0])
+
+        res = self.client.get(url, {"expand": "properties", "fields": "id"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data[0]), {"id", "properties"})
+        self.assertEqual(res.data[0]["properties"][0]["name"], "Property 1")
+
+    def test_list_equipment_single_query(self):
+        """Test that listing equipment doesn't fetch the factory"""
+        # ETag version and equipment
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse("equipment:list", args=[self.factory.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_equipment_permission_without_extra_queries(self):
+        """Test that the membership check reuses the fetched equipment"""
+        payload = {"name": "Equipment 1 updated"}
+        url = reverse("equipment:update", args=[self.equipment.id])
+        # fetch, unique name validation, savepoint, locked re-read, update,
+        # version bump and release
+        with self.assertNumQueries(7):
+            res = self.client.patch(url, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_other_factory_users_cannot_list_equipment(self):
         """Test that other factory users cannot list equipment"""
 
@@ -358,10 +399,10 @@ class PropertyAPITests(TestCase):
         user2.factory = factory2
         user2.save()
 
-        # create a property for equipment2
-        property2 = equipment2.property_set.create(
-            name="Property 2",
-            description="Property 2 description",
+        # create a property for equipment in factory1
+        property1 = self.equipment.property_set.create(
+            name="Property 1",
+            description="Property 1 description",
         )
 
         # logout current user
@@ -375,11 +416,60 @@ class PropertyAPITests(TestCase):
             "equipment": equipment2.id,
         }
         res = self.client.put(
-            reverse("equipment:update_property", args=[property2.id]), payload
+            reverse("equipment:update_property", args=[property1.id]), payload
         )
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
         
+    def test_cannot_move_property_to_other_factory(self):
+        """Test that a property can't reference another factory's equipment"""
+        factory2 = Factory.objects.create(
+            name="Factory 2",
+            address="Factory 2 address",
+            city="Factory 2 city",
+            country="Factory 2 country",
+        )
+        equipment2 = Equipment.objects.create(
+            factory=factory2,
+            name="Equipment 2",
+            description="Equipment 2 description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        property1 = self.equipment.property_set.create(
+            name="Property 1", description="Property 1 description"
+        )
+        payload = {
+            "name": "Property 1",
+            "description": "Property 1 description",
+            "equipment": equipment2.id,
+        }
+        res = self.client.put(
+            reverse("equipment:update_property", args=[property1.id]), payload
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("equipment", res.data)
+        property1.refresh_from_db()
+        self.assertEqual(property1.equipment_id, self.equipment.id)
+
+    def test_update_property_successful(self):
+        """Test updating a property of the user's factory"""
+        property1 = self.equipment.property_set.create(
+            name="Property 1",
+            description="Property 1 description",
+        )
+        payload = {
+            "name": "Property 1 updated",
+            "description": "Property 1 description",
+            "equipment": self.equipment.id,
+        }
+        res = self.client.put(
+            reverse("equipment:update_property", args=[property1.id]), payload
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        property1.refresh_from_db()
+        self.assertEqual(property1.name, payload["name"])
+
     def test_delete_equipment_successful(self):
         """Test deleting an equipment"""
         res = self.client.delete(DELETE_EQUIPMENT_URL, args=[self.equipment.id])
@@ -397,15 +487,6 @@ class PropertyAPITests(TestCase):
             city="Factory 2 city",
             country="Factory 2 country",
         )
-        # create a equipment in factory2
-        equipment2 = Equipment.objects.create(
-            factory=factory2,
-            name="Equipment 2",
-            description="Equipment 2 description",
-            price=100.00,
-            date="2021-01-01",
-            status=True,
-        )
         # create a user for factory2
         user2 = get_user_model().objects.create_user(
             email="ru2@test.com",
@@ -416,10 +497,10 @@ class PropertyAPITests(TestCase):
         user2.factory = factory2
         user2.save()
 
-        # create a property for equipment2
-        property2 = equipment2.property_set.create(
-            name="Property 2",
-            description="Property 2 description",
+        # create a property for equipment in factory1
+        property1 = self.equipment.property_set.create(
+            name="Property 1",
+            description="Property 1 description",
         )
         
         # logout current user
@@ -428,9 +509,742 @@ class PropertyAPITests(TestCase):
         
         # try to delete property in factory1
         res = self.client.delete(
-            reverse("equipment:delete_property", args=[property2.id])
+            reverse("equipment:delete_property", args=[property1.id])
         )
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
-        
\ No newline at end of file
+        
+
+class BulkEquipmentAPITests(TestCase):
+    """Test the bulk equipment API"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory 1",
+            address="Factory 1 address",
+            city="Factory 1 city",
+            country="Factory 1 country",
+        )
+        self.user = get_user_model().objects.create_user(
+            email="ru@test.com",
+            password="testpass",
+            factory=self.factory,
+        )
+        self.equipment = Equipment.objects.create(
+            factory=self.factory,
+            name="Equipment 1",
+            description="Equipment 1 description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        # the rows above bypass the API hooks maintaining the rollups
+        FactoryStats.objects.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, count, start=2):
+        return [
+            {
+                "name": f"Equipment {i}",
+                "description": f"Equipment {i} description",
+                "price": 100.00,
+                "date": "2021-01-01",
+            }
+            for i in range(start, start + count)
+        ]
+
+    def test_bulk_create_equipment(self):
+        """Test creating equipments with a constant number of queries"""
+        # factory, name check, savepoints, insert, rollup update, version bump and releases
+        with self.assertNumQueries(9):
+            res = self.client.post(
+                reverse("equipment:bulk_create"), self.payload(50), format="json"
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 50)
+        self.assertTrue(all(item["id"] for item in res.data))
+        self.assertEqual(self.factory.equipments.count(), 51)
+
+    def test_bulk_create_equipment_per_item_errors(self):
+        """Test that invalid items are reported and nothing is created"""
+        payload = self.payload(3)
+        payload[0]["name"] = "Equipment 1"
+        payload[1]["price"] = "not a price"
+        payload[2]["name"] = "Equipment 1"
+        res = self.client.post(reverse("equipment:bulk_create"), payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data[0])
+        self.assertIn("price", res.data[1])
+        self.assertIn("name", res.data[2])
+        self.assertEqual(Equipment.objects.count(), 1)
+
+    def test_bulk_update_equipment(self):
+        """Test updating equipments by id"""
+        created = self.client.post(
+            reverse("equipment:bulk_create"), self.payload(3), format="json"
+        ).data
+        payload = [{"id": item["id"], "price": 300.00} for item in created]
+        payload.append({"id": self.equipment.id, "name": "Equipment 1 renamed"})
+        # instances, name check, savepoints, update, rollup update, version bump and releases
+        with self.assertNumQueries(9):
+            res = self.client.patch(
+                reverse("equipment:bulk_update"), payload, format="json"
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(Equipment.objects.filter(price=300.00).count(), 3)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.name, "Equipment 1 renamed")
+
+    def test_bulk_update_other_factory_equipment(self):
+        """Test that equipment of other factories is reported as not found"""
+        factory2 = Factory.objects.create(
+            name="Factory 2",
+            address="Factory 2 address",
+            city="Factory 2 city",
+            country="Factory 2 country",
+        )
+        equipment2 = Equipment.objects.create(
+            factory=factory2,
+            name="Equipment 2",
+            description="Equipment 2 description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        payload = [
+            {"id": self.equipment.id, "price": 300.00},
+            {"id": equipment2.id, "price": 300.00},
+        ]
+        res = self.client.patch(
+            reverse("equipment:bulk_update"), payload, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("id", res.data[1])
+        equipment2.refresh_from_db()
+        self.assertEqual(equipment2.price, 100.00)
+
+    def test_bulk_update_duplicate_id(self):
+        """Test that an equipment can't be updated twice in one request"""
+        payload = [
+            {"id": self.equipment.id, "price": 20.00},
+            {"id": self.equipment.id, "price": 30.00},
+        ]
+        res = self.client.patch(
+            reverse("equipment:bulk_update"), payload, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(res.data[1]["id"], ["Duplicate id in this request."])
+        self.assertEqual(FactoryStats.objects.find_stale(), [])
+
+    def test_bulk_delete_equipment(self):
+        """Test deleting equipments by id"""
+        created = self.client.post(
+            reverse("equipment:bulk_create"), self.payload(3), format="json"
+        ).data
+        ids = [item["id"] for item in created]
+        res = self.client.delete(
+            reverse("equipment:bulk_delete"), {"ids": ids}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Equipment.objects.all()), [self.equipment])
+
+    def test_bulk_delete_missing_equipment(self):
+        """Test that nothing is deleted when an id is not found"""
+        res = self.client.delete(
+            reverse("equipment:bulk_delete"),
+            {"ids": [self.equipment.id, self.equipment.id + 100]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Equipment.objects.filter(id=self.equipment.id).exists())
+
+
+class BulkPropertyAPITests(TestCase):
+    """Test the bulk property API"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory 1",
+            address="Factory 1 address",
+            city="Factory 1 city",
+            country="Factory 1 country",
+        )
+        self.user = get_user_model().objects.create_user(
+            email="ru@test.com",
+            password="testpass",
+            factory=self.factory,
+        )
+        self.equipments = [
+            Equipment.objects.create(
+                factory=self.factory,
+                name=f"Equipment {i}",
+                description=f"Equipment {i} description",
+                price=100.00,
+                date="2021-01-01",
+            )
+            for i in range(2)
+        ]
+        self.existing = self.equipments[0].property_set.create(
+            name="Capacity 0", description="Old description"
+        )
+        FactoryStats.objects.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("equipment:bulk_create_property")
+
+    def payload(self):
+        return [
+            {
+                "name": f"{kind} {equipment.name[-1]}",
+                "description": "New description",
+                "equipment": equipment.id,
+            }
+            for equipment in self.equipments
+            for kind in ("Capacity", "Energy")
+        ]
+
+    def test_bulk_create_property_reports_conflicts(self):
+        """Test that existing names are per row errors by default"""
+        res = self.client.post(self.url, self.payload(), format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data[0])
+        self.assertEqual(res.data[1], {})
+        self.assertEqual(Property.objects.count(), 1)
+
+    def test_bulk_create_property(self):
+        """Test creating properties for many equipments with few queries"""
+        payload = self.payload()[1:]
+        # equipments, name check, savepoints, insert, rollup update, version bump and releases
+        with self.assertNumQueries(9):
+            res = self.client.post(self.url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row["status"] for row in res.data], ["created"] * 3)
+        self.assertEqual(self.equipments[1].property_set.count(), 2)
+
+    def test_bulk_create_property_skip(self):
+        """Test skipping properties whose name exists"""
+        res = self.client.post(
+            self.url + "?on_conflict=skip", self.payload(), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]["status"], "skipped")
+        self.assertEqual(res.data[0]["id"], self.existing.id)
+        self.assertEqual([row["status"] for row in res.data[1:]], ["created"] * 3)
+        self.assertTrue(all("id" in row for row in res.data))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.description, "Old description")
+
+    def test_bulk_create_property_update(self):
+        """Test updating properties whose name exists"""
+        res = self.client.post(
+            self.url + "?on_conflict=update", self.payload(), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]["status"], "updated")
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.description, "New description")
+        self.assertEqual(Property.objects.count(), 4)
+
+    def test_bulk_create_property_update_other_factory(self):
+        """Test that properties of other factories are never updated"""
+        factory2 = Factory.objects.create(
+            name="Factory 2",
+            address="Factory 2 address",
+            city="Factory 2 city",
+            country="Factory 2 country",
+        )
+        equipment2 = Equipment.objects.create(
+            factory=factory2,
+            name="Equipment 2",
+            description="Equipment 2 description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        other = equipment2.property_set.create(
+            name="Energy 0", description="Other description"
+        )
+        res = self.client.post(
+            self.url + "?on_conflict=update", self.payload(), format="json"
+        )
+        self.assertEqual(res.data[1], {"name": "Energy 0", "status": "skipped"})
+        other.refresh_from_db()
+        self.assertEqual(other.equipment, equipment2)
+        self.assertEqual(other.description, "Other description")
+
+    def test_bulk_create_property_other_factory_equipment(self):
+        """Test that equipment of other factories can't be referenced"""
+        factory2 = Factory.objects.create(
+            name="Factory 2",
+            address="Factory 2 address",
+            city="Factory 2 city",
+            country="Factory 2 country",
+        )
+        equipment2 = Equipment.objects.create(
+            factory=factory2,
+            name="Equipment 2",
+            description="Equipment 2 description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        payload = [{"name": "Energy 2", "description": "d", "equipment": equipment2.id}]
+        res = self.client.post(self.url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("equipment", res.data[0])
+
+    def test_bulk_create_property_invalid_on_conflict(self):
+        """Test that an unknown conflict mode is rejected"""
+        res = self.client.post(
+            self.url + "?on_conflict=merge", self.payload(), format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportEquipmentAPITests(TestCase):
+    """Test streaming the equipment of a factory"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory 1",
+            address="Factory 1 address",
+            city="Factory 1 city",
+            country="Factory 1 country",
+        )
+        self.user = get_user_model().objects.create_user(
+            email="ru@test.com",
+            password="testpass",
+            factory=self.factory,
+        )
+        self.equipments = [
+            Equipment.objects.create(
+                factory=self.factory,
+                name=f"Equipment {i}",
+                description=f"Equipment {i} description",
+                price=100.00,
+                date="2021-01-01",
+            )
+            for i in range(2)
+        ]
+        for name in ("Capacity", "Energy"):
+            self.equipments[0].property_set.create(
+                name=name, description=f"{name} description"
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("equipment:export", args=[self.factory.id])
+
+    def test_export_csv(self):
+        """Test exporting a csv row per equipment and property"""
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url)
+            lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertEqual(
+            lines[0].split(",")[-3:],
+            ["property_id", "property_name", "property_description"],
+        )
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[3].startswith(f"{self.equipments[1].id},Equipment 1,"))
+
+    def test_export_ndjson(self):
+        """Test exporting a json line per equipment"""
+        res = self.client.get(self.url, {"output": "ndjson"})
+        rows = [
+            json.loads(line) for line in b"".join(res.streaming_content).splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [e.id for e in self.equipments])
+        self.assertEqual(
+            [prop["name"] for prop in rows[0]["properties"]], ["Capacity", "Energy"]
+        )
+        self.assertEqual(rows[1]["properties"], [])
+        self.assertEqual(rows[0]["date"], "2021-01-01")
+
+    def test_export_other_factory(self):
+        """Test that users can't export other factories"""
+        factory2 = Factory.objects.create(
+            name="Factory 2",
+            address="Factory 2 address",
+            city="Factory 2 city",
+            country="Factory 2 country",
+        )
+        res = self.client.get(reverse("equipment:export", args=[factory2.id]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_invalid_output(self):
+        """Test that unknown export formats are rejected"""
+        res = self.client.get(self.url, {"output": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def export(self, output):
+        res = self.client.get(self.url, {"output": output})
+        return b"".join(res.streaming_content)
+
+    async def test_export_async(self):
+        """Test that ASGI requests stream the export from an async iterator"""
+        client = AsyncClient()
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        for output in ("csv", "ndjson"):
+            with self.subTest(output=output):
+                res = await client.get(
+                    self.url,
+                    {"output": output},
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                self.assertTrue(res.is_async)
+                content = b"".join([chunk async for chunk in res.streaming_content])
+                expected = await sync_to_async(self.export)(output)
+                self.assertEqual(content, expected)
+
+
+class EquipmentListFilterTests(TestCase):
+    """Test filtering, ordering and paginating the equipment list"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory 1",
+            address="Factory 1 address",
+            city="Factory 1 city",
+            country="Factory 1 country",
+        )
+        self.user = get_user_model().objects.create_user(
+            email="ru@test.com",
+            password="testpass",
+            factory=self.factory,
+        )
+        self.equipments = [
+            Equipment.objects.create(
+                factory=self.factory,
+                name=f"{prefix} {i}",
+                description="Description",
+                price=100.00 * (i + 1),
+                date=f"2021-0{i + 1}-01",
+                status=i % 2 == 0,
+            )
+            for i, prefix in enumerate(["Press", "Press", "Lathe", "Drill"])
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("equipment:list", args=[self.factory.id])
+
+    def get_names(self, params):
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [equipment["name"] for equipment in res.data]
+
+    def test_filter_status(self):
+        """Test filtering on status"""
+        self.assertEqual(self.get_names({"status": "false"}), ["Press 1", "Drill 3"])
+
+    def test_filter_date_range(self):
+        """Test filtering on a date range"""
+        names = self.get_names(
+            {"date_after": "2021-02-01", "date_before": "2021-03-01"}
+        )
+        self.assertEqual(names, ["Press 1", "Lathe 2"])
+
+    def test_filter_price_range(self):
+        """Test filtering on a price range"""
+        self.assertEqual(
+            self.get_names({"price_min": 250, "price_max": 400}), ["Lathe 2", "Drill 3"]
+        )
+
+    def test_filter_name_prefix(self):
+        """Test filtering on a name prefix"""
+        self.assertEqual(self.get_names({"name": "Press"}), ["Press 0", "Press 1"])
+
+    def test_ordering(self):
+        """Test ordering on an allowed field"""
+        self.assertEqual(
+            self.get_names({"ordering": "-price"}),
+            ["Drill 3", "Lathe 2", "Press 1", "Press 0"],
+        )
+
+    def test_unknown_factory(self):
+        """Test that listing the equipment of a missing factory is a 404"""
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(reverse("equipment:list", args=[self.factory.id + 1]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_filter(self):
+        """Test that invalid filter values are rejected"""
+        res = self.client.get(self.url, {"date_after": "yesterday"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("date_after", res.data)
+
+    def test_keyset_pagination(self):
+        """Test paging through a filtered and ordered list"""
+        res = self.client.get(
+            self.url, {"page_size": 1, "ordering": "-date", "price_min": 150}
+        )
+        names = [equipment["name"] for equipment in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            names += [equipment["name"] for equipment in res.data["results"]]
+        self.assertEqual(names, ["Drill 3", "Lathe 2", "Press 1"])
+
+    def test_keyset_pagination_ties(self):
+        """Test paging through equal values by id, without offsets"""
+        for i in range(4):
+            Equipment.objects.create(
+                factory=self.factory,
+                name=f"Tie {i}",
+                description="Description",
+                price=100.00,
+                date="2021-01-01",
+            )
+        expected = list(
+            Equipment.objects.filter(factory=self.factory)
+            .order_by("price", "id")
+            .values_list("name", flat=True)
+        )
+        pages = []
+        res = self.client.get(self.url, {"page_size": 2, "ordering": "price"})
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                pages.append([equipment["name"] for equipment in res.data["results"]])
+                if not res.data["next"]:
+                    break
+                res = self.client.get(res.data["next"])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+
+        # and back
+        res = self.client.get(res.data["previous"])
+        self.assertEqual(
+            [equipment["name"] for equipment in res.data["results"]], pages[-2]
+        )
+
+
+class FactoryStatsRollupTests(TestCase):
+    """Test that the equipment and property endpoints keep the rollups in sync"""
+
+    def setUp(self):
+        self.factories = [
+            Factory.objects.create(
+                name=f"Factory {i}",
+                address="Test Address",
+                city="Test City",
+                country="Test Country",
+            )
+            for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="su@test.com", password="testpass"
+            )
+        )
+
+    def assertStats(self, factory, **expected):
+        """Assert the rollup of factory and that no rollup is stale"""
+        self.assertEqual(FactoryStats.objects.find_stale(), [])
+        stats = FactoryStats.objects.filter(factory=factory).values(*expected).get()
+        self.assertEqual(stats, expected)
+
+    def create_equipment(self, name, **fields):
+        payload = {
+            "name": name,
+            "description": "Test Description",
+            "price": 100.00,
+            "date": "2021-01-01",
+            **fields,
+        }
+        res = self.client.post(CREATE_EQUIPMENT_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data["id"]
+
+    def test_equipment_writes(self):
+        """Test creating, updating and deleting equipment"""
+        factory = self.factories[-1]
+        first = self.create_equipment("Equipment 1")
+        self.create_equipment("Equipment 2", status=False)
+        self.assertStats(
+            factory, equipment_count=2, active_equipment_count=1, total_price=200.0
+        )
+
+        self.client.patch(
+            reverse("equipment:update", args=[first]), {"price": 50.0, "status": False}
+        )
+        self.assertStats(
+            factory, equipment_count=2, active_equipment_count=0, total_price=150.0
+        )
+
+        self.client.post(
+            reverse("equipment:create_property", args=[first]),
+            {"name": "Capacity", "description": "Test Description", "equipment": first},
+        )
+        self.assertStats(factory, property_count=1)
+
+        self.client.delete(reverse("equipment:delete", args=[first]))
+        self.assertStats(
+            factory, equipment_count=1, total_price=100.0, property_count=0
+        )
+
+    def test_update_moves_current_values(self):
+        """Test that an update moves the values of the row it locked"""
+        factory = self.factories[-1]
+        pk = self.create_equipment("Equipment 1")
+        view_get_object = UpdateEquipmentAPIView.get_object
+
+        def get_object(view):
+            equipment = view_get_object(view)
+            # a concurrent update commits between the read and the save
+            Equipment.objects.filter(pk=pk).update(price=40.0)
+            FactoryStats.objects.rebuild()
+            return equipment
+
+        with mock.patch.object(UpdateEquipmentAPIView, "get_object", get_object):
+            res = self.client.patch(
+                reverse("equipment:update", args=[pk]), {"status": False}
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["price"], 40.0)
+        self.assertStats(factory, active_equipment_count=0, total_price=40.0)
+
+    def test_bulk_equipment_writes(self):
+        """Test bulk creating, updating and deleting equipment"""
+        factory = self.factories[-1]
+        payload = [
+            {
+                "name": f"Equipment {i}",
+                "description": "Test Description",
+                "price": 10.0,
+                "date": "2021-01-01",
+            }
+            for i in range(3)
+        ]
+        created = self.client.post(
+            reverse("equipment:bulk_create"), payload, format="json"
+        ).data
+        self.assertStats(factory, equipment_count=3, total_price=30.0)
+
+        self.client.patch(
+            reverse("equipment:bulk_update"),
+            [{"id": item["id"], "status": False} for item in created[:2]],
+            format="json",
+        )
+        self.assertStats(factory, active_equipment_count=1)
+
+        self.client.post(
+            reverse("equipment:bulk_create_property"),
+            [
+                {"name": f"Property {i}", "description": "d", "equipment": item["id"]}
+                for i, item in enumerate(created)
+            ],
+            format="json",
+        )
+        self.assertStats(factory, property_count=3)
+
+        self.client.delete(
+            reverse("equipment:bulk_delete"),
+            {"ids": [item["id"] for item in created[1:]]},
+            format="json",
+        )
+        self.assertStats(
+            factory,
+            equipment_count=1,
+            active_equipment_count=0,
+            total_price=10.0,
+            property_count=1,
+        )
+
+    def test_property_moved_between_factories(self):
+        """Test moving a property to equipment of another factory"""
+        equipments = [
+            Equipment.objects.create(
+                factory=factory,
+                name=f"{factory.name} Equipment",
+                description="Test Description",
+                price=100.00,
+                date="2021-01-01",
+            )
+            for factory in self.factories
+        ]
+        FactoryStats.objects.rebuild()
+        res = self.client.post(
+            reverse("equipment:create_property", args=[equipments[0].id]),
+            {
+                "name": "Capacity",
+                "description": "Test Description",
+                "equipment": equipments[0].id,
+            },
+        )
+        self.client.patch(
+            reverse("equipment:update_property", args=[res.data["id"]]),
+            {"equipment": equipments[1].id},
+        )
+        self.assertStats(self.factories[0], property_count=0)
+        self.assertStats(self.factories[1], property_count=1)
+
+        self.client.post(
+            reverse("equipment:bulk_create_property") + "?on_conflict=update",
+            [{"name": "Capacity", "description": "d", "equipment": equipments[0].id}],
+            format="json",
+        )
+        self.assertStats(self.factories[0], property_count=1)
+        self.assertStats(self.factories[1], property_count=0)
+
+        self.client.delete(reverse("equipment:delete_property", args=[res.data["id"]]))
+        self.assertStats(self.factories[0], property_count=0)
+
+
+class EquipmentValuesSerializerTests(TestCase):
+    """Test that the equipment list fast path matches EquipmentSerializer"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        for i in range(4):
+            equipment = Equipment.objects.create(
+                factory=self.factory,
+                name=f"Equipment {i}",
+                description="Açıklama",
+                price=i * 10.5,
+                date=f"2021-0{i + 1}-01",
+                status=i % 2 == 0,
+            )
+            for j in range(i):
+                equipment.property_set.create(name=f"Property {i}-{j}", description="d")
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="su@test.com", password="testpass"
+            )
+        )
+
+    def assertSameAsSerializer(self, params, queryset):
+        url = reverse("equipment:list", args=[self.factory.id])
+        res = self.client.get(url, params)
+        request = Request(APIRequestFactory().get(url, params))
+        expected = EquipmentSerializer(
+            queryset, many=True, context={"request": request}
+        ).data
+        self.assertEqual(res.content, JSONRenderer().render(expected))
+
+    def test_parity(self):
+        """Test the default, expanded, sparse and filtered lists"""
+        equipments = Equipment.objects.order_by("id")
+        self.assertSameAsSerializer({}, equipments)
+        self.assertSameAsSerializer({"expand": "properties"}, equipments)
+        self.assertSameAsSerializer(
+            {"fields": "name,date", "status": "true"}, equipments.filter(status=True)
+        )
+        self.assertSameAsSerializer(
+            {"ordering": "-price", "expand": "properties"},
+            equipments.order_by("-price"),
+        )
+
+    def test_paginated_parity(self):
+        """Test that cursor pages over the rows match too"""
+        url = reverse("equipment:list", args=[self.factory.id])
+        res = self.client.get(url, {"page_size": 2, "ordering": "-date"})
+        expected = EquipmentSerializer(
+            Equipment.objects.order_by("-date")[:2], many=True
+        ).data
+        self.assertEqual(res.data["results"], expected)
+        res = self.client.get(res.data["next"])
+        names = [row["name"] for row in res.data["results"]]
+        self.assertEqual(names, ["Equipment 1", "Equipment 0"])
@@ -1,10 +1,15 @@
 from django.urls import path
 from equipment.views import (
     EquipmentListByFactoryIdAPIView,
+    ExportEquipmentAPIView,
     CreateEquipmentAPIView,
+    BulkCreateEquipmentAPIView,
+    BulkUpdateEquipmentAPIView,
+    BulkDeleteEquipmentAPIView,
     UpdateEquipmentAPIView,
     DeleteEquipmentAPIView,
     CreatePropertyAPIView,
+    BulkCreatePropertyAPIView,
     DeletePropertyAPIView,
     UpdatePropertyAPIView,
 )
@@ -16,14 +21,24 @@ urlpatterns = [
     # All Users
     path("create/", CreateEquipmentAPIView.as_view(), name="create"),
     path("list/<int:pk>/", EquipmentListByFactoryIdAPIView.as_view(), name="list"),
+    path("export/<int:pk>/", ExportEquipmentAPIView.as_view(), name="export"),
     path("update/<int:pk>/", UpdateEquipmentAPIView.as_view(), name="update"),
     path("delete/<int:pk>/", DeleteEquipmentAPIView.as_view(), name="delete"),
+    # Bulk API
+    path("bulk_create/", BulkCreateEquipmentAPIView.as_view(), name="bulk_create"),
+    path("bulk_update/", BulkUpdateEquipmentAPIView.as_view(), name="bulk_update"),
+    path("bulk_delete/", BulkDeleteEquipmentAPIView.as_view(), name="bulk_delete"),
     # Property API
     path(
         "create_property/<int:pk>/",
         CreatePropertyAPIView.as_view(),
         name="create_property",
     ),
+    path(
+        "bulk_create_property/",
+        BulkCreatePropertyAPIView.as_view(),
+        name="bulk_create_property",
+    ),
     path(
         "update_property/<int:pk>/",
         UpdatePropertyAPIView.as_view(),
@@ -1,34 +1,235 @@
+import csv
+from itertools import groupby
+
 import rest_framework.generics
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404
 
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, BasePermission
-from core.models import Equipment, Factory, Property
-from equipment.serializers import EquipmentSerializer, PropertySerializer
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from core.cache import CachedResponseMixin, ETagMixin, invalidate_factories
+from core.models import (
+    Equipment,
+    Factory,
+    FactoryStats,
+    Property,
+    compute_factory_stats,
+    equipment_changes,
+    group_changes,
+)
+from core.db import aiterate
+from core.pagination import IdCursorPagination, StableOrderingFilter
+from core.renderers import ORJSONRenderer
+from core.views import AsyncReadMixin, ValuesListMixin
+from equipment.serializers import (
+    BulkDeleteSerializer,
+    EquipmentFilterSerializer,
+    EquipmentSerializer,
+    EquipmentValuesSerializer,
+    PropertyOutcomeSerializer,
+    PropertySerializer,
+)
+
+
+def get_factory_id(obj):
+    """Return the id of the factory an equipment or property belongs to"""
+    if isinstance(obj, Property):
+        return obj.equipment.factory_id
+    return obj.factory_id
+
+
+def property_changes(prop, sign=1):
+    """Return the (factory id, rollup changes) of adding (sign=-1: removing) a property"""
+    return prop.equipment.factory_id, {"property_count": sign}
+
+
+def record_changes(changes_by_factory):
+    """Update the rollups and the cached responses of the changed factories"""
+    FactoryStats.objects.add(changes_by_factory)
+    Factory.objects.filter(pk__in=changes_by_factory).bump_version()
+    invalidate_factories(changes_by_factory)
+
+
+def get_user_factory(user):
+    """Return the factory new equipment of the user is created in"""
+    if user.is_superuser:
+        # get lastly created factory
+        return Factory.objects.last()
+    return get_object_or_404(Factory, pk=user.factory_id)
 
 
 class IsFactoryMember(BasePermission):
     """Check if user is a member of the factory"""
 
     def has_permission(self, request, view):
-        """Check if user is a member of the factory"""
+        """Check the factory in the url of views that set factory_url_kwarg"""
+        if request.user.is_staff:
+            return True
+        factory_url_kwarg = getattr(view, "factory_url_kwarg", None)
+        if factory_url_kwarg is None:
+            return True
+        return request.user.factory_id == view.kwargs.get(factory_url_kwarg)
+
+    def has_object_permission(self, request, view, obj):
+        """Check if the object belongs to the user's factory"""
         if request.user.is_staff:
             return True
-        factory = get_object_or_404(Factory, pk=view.kwargs.get("pk"))
-        return factory.user_set.filter(id=request.user.id).exists()
-        
+        return request.user.factory_id == get_factory_id(obj)
+
+
+def factory_version(version):
+    """Return the version of the factory in the url, 404 if it doesn't exist"""
+    # the version counts the factories
+    if not version[0]:
+        raise Http404
+    return version
 
-class EquipmentListByFactoryIdAPIView(generics.ListAPIView):
+
+@extend_schema(parameters=[EquipmentFilterSerializer])
+class EquipmentListByFactoryIdAPIView(
+    CachedResponseMixin,
+    ETagMixin,
+    AsyncReadMixin,
+    ValuesListMixin,
+    generics.ListAPIView,
+):
     """List all equipment in given factory"""
 
     serializer_class = EquipmentSerializer
+    values_serializer_class = EquipmentValuesSerializer
     permission_classes = [IsAuthenticated, IsFactoryMember]
-  
+    factory_url_kwarg = "pk"
+    pagination_class = IdCursorPagination
+    filter_backends = [StableOrderingFilter]
+    ordering_fields = ["id", "name", "date", "price"]
+    ordering = ["id"]
+
+    def get_cache_scopes(self):
+        return [f"factory:{self.kwargs.get('pk')}"]
+
+    def get_etag_version(self):
+        return factory_version(
+            Factory.objects.filter(pk=self.kwargs.get("pk")).version()
+        )
+
+    async def aget_etag_version(self):
+        return factory_version(
+            await Factory.objects.filter(pk=self.kwargs.get("pk")).aversion()
+        )
+
     def get_queryset(self):
         """Return all equipment in given factory"""
-        factory = get_object_or_404(Factory, pk=self.kwargs.get("pk"))
-        return factory.equipments.all()
+        params = EquipmentFilterSerializer(data=self.request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        return Equipment.objects.filter(
+            factory_id=self.kwargs.get("pk"), **params.get_filters()
+        )
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_EQUIPMENT_FIELDS = ("id", "name", "description", "price", "date", "status")
+EXPORT_PROPERTY_FIELDS = ("property__id", "property__name", "property__description")
+
+
+class Echo:
+    """File-like object returning what is written, for streaming csv"""
+
+    def write(self, value):
+        return value
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            "output", str, enum=("csv", "ndjson"), description="Export format"
+        )
+    ],
+    responses={200: bytes},
+)
+class ExportEquipmentAPIView(generics.GenericAPIView):
+    """Stream all equipment of a factory with their properties"""
+
+    permission_classes = [IsAuthenticated, IsFactoryMember]
+    factory_url_kwarg = "pk"
+
+    def get_queryset(self):
+        """Return one row per equipment and property, equipment first"""
+        return (
+            Equipment.objects.filter(factory_id=self.kwargs.get("pk"))
+            .order_by("id", "property__id")
+            .values_list(*EXPORT_EQUIPMENT_FIELDS, *EXPORT_PROPERTY_FIELDS)
+        )
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get("output", "csv")
+        if output not in ("csv", "ndjson"):
+            raise ValidationError({"output": ["Must be one of: csv, ndjson."]})
+        queryset = self.get_queryset()
+        # ASGI servers consume sync iterators whole, give them an async one
+        if isinstance(request._request, ASGIRequest):
+            rows = aiterate(queryset, EXPORT_CHUNK_SIZE)
+            stream = self.astream_csv if output == "csv" else self.astream_ndjson
+        else:
+            rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            stream = self.stream_csv if output == "csv" else self.stream_ndjson
+        content_type = "text/csv" if output == "csv" else "application/x-ndjson"
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        filename = f"factory-{self.kwargs.get('pk')}-equipment.{output}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def csv_header(self, writer):
+        return writer.writerow(
+            EXPORT_EQUIPMENT_FIELDS
+            + tuple(field.replace("__", "_") for field in EXPORT_PROPERTY_FIELDS)
+        )
+
+    def stream_csv(self, rows):
+        """Yield a csv line per equipment and property"""
+        writer = csv.writer(Echo())
+        yield self.csv_header(writer)
+        for row in rows:
+            yield writer.writerow(row)
+
+    async def astream_csv(self, rows):
+        """Async stream_csv()"""
+        writer = csv.writer(Echo())
+        yield self.csv_header(writer)
+        async for row in rows:
+            yield writer.writerow(row)
+
+    def render_equipment(self, group):
+        """Return the json line of the rows of one equipment"""
+        size = len(EXPORT_EQUIPMENT_FIELDS)
+        equipment = dict(zip(EXPORT_EQUIPMENT_FIELDS, group[0][:size]))
+        equipment["properties"] = [
+            {"id": row[size], "name": row[size + 1], "description": row[size + 2]}
+            for row in group
+            if row[size] is not None
+        ]
+        return ORJSONRenderer().render(equipment) + b"\n"
+
+    def stream_ndjson(self, rows):
+        """Yield a json line per equipment with its properties embedded"""
+        for _, group in groupby(rows, key=lambda row: row[0]):
+            yield self.render_equipment(list(group))
+
+    async def astream_ndjson(self, rows):
+        """Async stream_ndjson()"""
+        group = []
+        async for row in rows:
+            if group and row[0] != group[0][0]:
+                yield self.render_equipment(group)
+                group = []
+            group.append(row)
+        if group:
+            yield self.render_equipment(group)
 
 
 class CreateEquipmentAPIView(generics.CreateAPIView):
@@ -38,16 +239,104 @@ class CreateEquipmentAPIView(generics.CreateAPIView):
     serializer_class = EquipmentSerializer
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """Create a new equipment"""
-        if self.request.user.is_superuser:
-            # get lastly created factory
-            factory = Factory.objects.last()
+        equipment = serializer.save(factory=get_user_factory(self.request.user))
+        record_changes({equipment.factory_id: equipment_changes(equipment)})
 
-        else:
-            factory = get_object_or_404(Factory, pk=self.request.user.factory.id)
-            
-        serializer.save(factory=factory)
+
+class BulkCreateEquipmentAPIView(generics.CreateAPIView):
+    """Create many equipments in one transaction"""
+
+    serializer_class = EquipmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs["many"] = True
+        return super().get_serializer(*args, **kwargs)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        """Create the equipments in the user's factory"""
+        equipments = serializer.save(factory=get_user_factory(self.request.user))
+        record_changes(
+            group_changes(
+                (equipment.factory_id, equipment_changes(equipment))
+                for equipment in equipments
+            )
+        )
+
+
+class BulkEquipmentMixin:
+    """Restrict bulk changes to the equipment of the user's factory"""
+
+    serializer_class = EquipmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Equipment.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(factory_id=self.request.user.factory_id)
+        return queryset
+
+
+class BulkUpdateEquipmentAPIView(BulkEquipmentMixin, generics.GenericAPIView):
+    """Update many equipments by id in one transaction"""
+
+    @extend_schema(request=EquipmentSerializer(many=True))
+    def patch(self, request, *args, **kwargs):
+        items = request.data if isinstance(request.data, list) else []
+        ids = [item.get("id") for item in items if isinstance(item, dict)]
+        with transaction.atomic():
+            # the rows are locked before the rollup changes are read from them
+            instances = self.get_queryset().select_for_update()
+            instances = list(
+                instances.filter(id__in=[pk for pk in ids if isinstance(pk, int)])
+            )
+            serializer = self.get_serializer(
+                instances, data=request.data, many=True, partial=True
+            )
+            serializer.is_valid(raise_exception=True)
+            removed = [
+                (equipment.factory_id, equipment_changes(equipment, -1))
+                for equipment in instances
+            ]
+            updated = serializer.save()
+            record_changes(
+                group_changes(
+                    removed
+                    + [
+                        (equipment.factory_id, equipment_changes(equipment))
+                        for equipment in updated
+                    ]
+                )
+            )
+        return Response(serializer.data)
+
+
+class BulkDeleteEquipmentAPIView(BulkEquipmentMixin, generics.GenericAPIView):
+    """Delete many equipments by id in one transaction"""
+
+    @extend_schema(request=BulkDeleteSerializer, responses={204: None})
+    def delete(self, request, *args, **kwargs):
+        serializer = BulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+        with transaction.atomic():
+            queryset = self.get_queryset().filter(id__in=ids)
+            missing = ids - set(queryset.values_list("id", flat=True))
+            if missing:
+                raise ValidationError({"ids": [f"Not found: {sorted(missing)}"]})
+            removed = compute_factory_stats(queryset)
+            queryset.delete()
+            record_changes(
+                {
+                    factory_id: {field: -value for field, value in stats.items()}
+                    for factory_id, stats in removed.items()
+                }
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class UpdateEquipmentAPIView(generics.UpdateAPIView):
@@ -59,6 +348,23 @@ class UpdateEquipmentAPIView(generics.UpdateAPIView):
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    def perform_update(self, serializer):
+        """Update the equipment and move its rollup values"""
+        with transaction.atomic():
+            # the row read by get_object() may have changed since, lock it and
+            # update the values it holds now
+            old = get_object_or_404(
+                Equipment.objects.select_for_update(), pk=serializer.instance.pk
+            )
+            serializer.instance = old
+            removed = (old.factory_id, equipment_changes(old, -1))
+            equipment = serializer.save()
+            record_changes(
+                group_changes(
+                    [removed, (equipment.factory_id, equipment_changes(equipment))]
+                )
+            )
+
 
 class DeleteEquipmentAPIView(generics.DestroyAPIView):
     """Delete equipment by id"""
@@ -69,6 +375,122 @@ class DeleteEquipmentAPIView(generics.DestroyAPIView):
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Delete the equipment with its properties from the rollup"""
+        changes = equipment_changes(instance, -1)
+        changes["property_count"] = -instance.property_set.count()
+        instance.delete()
+        record_changes({instance.factory_id: changes})
+
+
+ON_CONFLICT_CHOICES = ("error", "skip", "update")
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            "on_conflict",
+            str,
+            enum=ON_CONFLICT_CHOICES,
+            description="What to do with properties whose name already exists",
+        )
+    ],
+    request=PropertySerializer(many=True),
+    responses={201: PropertyOutcomeSerializer(many=True)},
+)
+class BulkCreatePropertyAPIView(BulkEquipmentMixin, generics.GenericAPIView):
+    """Create many properties for one or many equipments in one transaction"""
+
+    serializer_class = PropertySerializer
+
+    def get_on_conflict(self):
+        on_conflict = self.request.query_params.get("on_conflict", "error")
+        if on_conflict not in ON_CONFLICT_CHOICES:
+            raise ValidationError(
+                {"on_conflict": [f"Must be one of: {', '.join(ON_CONFLICT_CHOICES)}."]}
+            )
+        return on_conflict
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["on_conflict"] = self.get_on_conflict()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        # only equipment of the user's factory can be referenced
+        serializer.child.fields["equipment"].queryset = self.get_queryset()
+        serializer.is_valid(raise_exception=True)
+        on_conflict = serializer.context["on_conflict"]
+        if on_conflict == "error":
+            with transaction.atomic():
+                created = serializer.save()
+                record_changes(
+                    group_changes(property_changes(prop) for prop in created)
+                )
+            outcomes = [
+                {"id": prop.id, "name": prop.name, "status": "created"}
+                for prop in created
+            ]
+        else:
+            outcomes = self.save_with_conflicts(serializer.validated_data, on_conflict)
+        return Response(outcomes, status=status.HTTP_201_CREATED)
+
+    def save_with_conflicts(self, validated_data, on_conflict):
+        """Insert the new properties and skip or update the existing ones"""
+        user = self.request.user
+        existing = Property.objects.select_related("equipment").in_bulk(
+            [attrs["name"] for attrs in validated_data], field_name="name"
+        )
+        new, updated, outcomes, changes = [], [], [], []
+        for attrs in validated_data:
+            prop = existing.get(attrs["name"])
+            if prop is None:
+                new.append(Property(**attrs))
+                outcomes.append({"name": attrs["name"], "status": "created"})
+                continue
+            in_scope = user.is_staff or prop.equipment.factory_id == user.factory_id
+            if on_conflict == "update" and in_scope:
+                changes.append(property_changes(prop, -1))
+                prop.description = attrs["description"]
+                prop.equipment = attrs["equipment"]
+                updated.append(prop)
+                changes.append(property_changes(prop))
+                outcomes.append({"id": prop.id, "name": prop.name, "status": "updated"})
+            else:
+                outcome = {"name": prop.name, "status": "skipped"}
+                if in_scope:
+                    outcome["id"] = prop.id
+                outcomes.append(outcome)
+
+        with transaction.atomic():
+            Property.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+            Property.objects.bulk_update(
+                updated, ["description", "equipment"], batch_size=1000
+            )
+            inserted = {
+                name: (pk, equipment_id)
+                for name, pk, equipment_id in Property.objects.filter(
+                    name__in=[prop.name for prop in new]
+                ).values_list("name", "id", "equipment_id")
+            }
+
+            new_properties = {prop.name: prop for prop in new}
+            for outcome in outcomes:
+                if outcome["status"] != "created":
+                    continue
+                prop = new_properties[outcome["name"]]
+                pk, equipment_id = inserted.get(outcome["name"], (None, None))
+                if equipment_id == prop.equipment_id:
+                    outcome["id"] = pk
+                    changes.append(property_changes(prop))
+                else:
+                    # lost a race against a concurrent insert of the same name
+                    outcome["status"] = "skipped"
+            record_changes(group_changes(changes))
+        return outcomes
+
 
 class CreatePropertyAPIView(generics.CreateAPIView):
     """Create a new property in the system"""
@@ -79,7 +501,10 @@ class CreatePropertyAPIView(generics.CreateAPIView):
     def perform_create(self, serializer):
         """Create a new property"""
         equipment = get_object_or_404(Equipment, pk=self.kwargs.get("pk"))
-        serializer.save(equipment=equipment)
+        self.check_object_permissions(self.request, equipment)
+        with transaction.atomic():
+            prop = serializer.save(equipment=equipment)
+            record_changes(group_changes([property_changes(prop)]))
 
 
 class UpdatePropertyAPIView(generics.UpdateAPIView):
@@ -87,16 +512,41 @@ class UpdatePropertyAPIView(generics.UpdateAPIView):
 
     serializer_class = PropertySerializer
     permission_classes = [IsAuthenticated, IsFactoryMember]
-    queryset = Property.objects.all()
+    queryset = Property.objects.select_related("equipment")
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # the schema is generated without a user
+        if getattr(self, "swagger_fake_view", False):
+            return serializer
+        if not self.request.user.is_staff:
+            # only equipment of the user's factory can be referenced
+            serializer.fields["equipment"].queryset = Equipment.objects.filter(
+                factory_id=self.request.user.factory_id
+            )
+        return serializer
+
+    def perform_update(self, serializer):
+        """Update the property and move it between factory rollups"""
+        removed = property_changes(serializer.instance, -1)
+        with transaction.atomic():
+            prop = serializer.save()
+            record_changes(group_changes([removed, property_changes(prop)]))
+
 
 class DeletePropertyAPIView(generics.DestroyAPIView):
     """Delete property by id"""
 
     serializer_class = PropertySerializer
     permission_classes = [IsAuthenticated, IsFactoryMember]
-    queryset = Property.objects.all()
+    queryset = Property.objects.select_related("equipment")
     lookup_field = "pk"
-    lookup_url_kwarg = "pk"
\ No newline at end of file
+    lookup_url_kwarg = "pk"
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Delete the property and remove it from the rollup"""
+        instance.delete()
+        record_changes(group_changes([property_changes(instance, -1)]))
@@ -1,13 +1,30 @@
 import uuid
 
+from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from core.models import Factory
+from core.models import Equipment, Factory, factory_prefetches
+from core.serializers import DynamicFieldsMixin, ValuesSerializer
 
 from django.contrib.auth import get_user_model
 from drf_spectacular.utils import extend_schema_field
 
 
-class FactorySerializer(serializers.ModelSerializer):
+USER_FIELDS = {"user_id", "user_email", "all_users"}
+
+
+def default_user_fields(name):
+    """Return the fields of the default user created with a factory"""
+    return {
+        "email": f"{uuid.uuid4()}@factory.com",
+        "name": name,
+        "surname": "Default Surname",
+        "is_staff": True,
+    }
+
+
+class FactorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
    
     ## add extrafield and extract created factory's user id
     user_id = serializers.SerializerMethodField(help_text="Id of the first user in this factory")
@@ -20,30 +37,39 @@ class FactorySerializer(serializers.ModelSerializer):
         fields = ["id", "name", "address", "city", "country", "user_id", "user_email", "all_users", "equipments"]
         read_only_fields = ["id", ]
 
+    @transaction.atomic
     def create(self, validated_data):
-        newly_created_user = get_user_model().objects.create_user(
-            email=f"{uuid.uuid4()}@factory.com",
-            password="changeme",
-            name=self.validated_data["name"],
-            surname="Default Surname",
-            is_staff=True,
-        )
         instance = super().create(validated_data)
-        newly_created_user.factory = instance
-        newly_created_user.save()
+        # no password to hash, it is set with the token of CreateFactorySerializer
+        instance.default_user = get_user_model().objects.create_user(
+            password=None, factory=instance, **default_user_fields(instance.name)
+        )
         return instance
     
+    def get_relations(self):
+        """Return which relations the requested fields need prefetched"""
+        return {
+            "users": not USER_FIELDS.isdisjoint(self.fields),
+            "equipments": "equipments" in self.fields,
+        }
+
+    def to_representation(self, instance):
+        # reuse the view's prefetches, fetch them once for bare instances
+        prefetch_related_objects(
+            [instance], *factory_prefetches(**self.get_relations())
+        )
+        return super().to_representation(instance)
+
     @extend_schema_field(int)
     def get_user_id(self, obj):
-        if obj.user_set.first() is None:
-            return None
         return obj.first_user_id
     
     @extend_schema_field(str)
     def get_user_email(self, obj):
-        if obj.user_set.first() is None:
+        user = obj.first_user
+        if user is None:
             return None
-        return obj.user_set.first().email
+        return user.email
     
     @extend_schema_field(list)
     def get_all_users(self, obj):
@@ -53,4 +79,76 @@ class FactorySerializer(serializers.ModelSerializer):
     @extend_schema_field(list)
     def get_equipments(self, obj):
         equipments = obj.equipments.all()
-        return [{"id": equipment.id, "name": equipment.name, "description": equipment.description, "price": equipment.price, "date": equipment.date, "status": equipment.status} for equipment in equipments]
\ No newline at end of file
+        return [{"id": equipment.id, "name": equipment.name, "description": equipment.description, "price": equipment.price, "date": equipment.date, "status": equipment.status} for equipment in equipments]
+
+
+class CreateFactorySerializer(FactorySerializer):
+    """FactorySerializer returning the token to set the default user's password"""
+
+    set_password_token = serializers.SerializerMethodField(
+        help_text="One-time token for user:set_password of the user in user_id"
+    )
+
+    class Meta(FactorySerializer.Meta):
+        fields = FactorySerializer.Meta.fields + ["set_password_token"]
+
+    @extend_schema_field(str)
+    def get_set_password_token(self, obj):
+        user = getattr(obj, "default_user", None)
+        if user is None:
+            return None
+        return default_token_generator.make_token(user)
+
+
+class FactoryValuesSerializer(ValuesSerializer):
+    """Read-only FactorySerializer for list responses"""
+
+    columns = {
+        "id": "id",
+        "name": "name",
+        "address": "address",
+        "city": "city",
+        "country": "country",
+    }
+
+    def add_relations(self, rows, data):
+        ids = [row["id"] for row in rows]
+        if not USER_FIELDS.isdisjoint(self.field_names):
+            users = self.group_by(
+                get_user_model()
+                .objects.filter(factory_id__in=ids)
+                .order_by("id")
+                .values("id", "email", "is_staff", "factory_id"),
+                "factory_id",
+            )
+            for row, item in zip(rows, data):
+                factory_users = users.get(row["id"], [])
+                first = factory_users[0] if factory_users else {}
+                if "user_id" in item:
+                    item["user_id"] = first.get("id")
+                if "user_email" in item:
+                    item["user_email"] = first.get("email")
+                if "all_users" in item:
+                    item["all_users"] = factory_users
+        if "equipments" in self.field_names:
+            equipments = self.group_by(
+                Equipment.objects.filter(factory_id__in=ids)
+                .order_by("id")
+                .values(
+                    "id", "name", "description", "price", "date", "status", "factory_id"
+                ),
+                "factory_id",
+            )
+            for row, item in zip(rows, data):
+                item["equipments"] = equipments.get(row["id"], [])
+
+
+class FactoryStatsSerializer(serializers.Serializer):
+    """Serializer for the aggregate statistics of factories"""
+
+    equipment_count = serializers.IntegerField()
+    active_equipment_count = serializers.IntegerField()
+    total_price = serializers.FloatField()
+    first_date = serializers.DateField(allow_null=True)
+    last_date = serializers.DateField(allow_null=True)
+    property_count = serializers.IntegerField()
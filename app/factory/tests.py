@@ -1,11 +1,19 @@
-from django.test import TestCase
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
-from core.models import Factory
+from core.models import Factory, FactoryStats, Equipment
+from factory.serializers import FactorySerializer
 
 
 class FactoryUserTests(TestCase):
@@ -259,15 +267,50 @@ class AdminUserTests(TestCase):
         }
         res = self.client.post(reverse("factory:create"), payload)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        # get token for the autogenerated user
+        # set the password of the autogenerated user
         user_email = res.data.get("user_email")
+        set_password = {
+            "user_id": res.data["user_id"],
+            "token": res.data["set_password_token"],
+            "password": "newpass123",
+        }
+        res = self.client.post(reverse("user:set_password"), set_password)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        # get token for the autogenerated user
         res = self.client.post(
             reverse("user:token_obtain_pair"),
-            {"email": user_email, "password": "changeme"},
+            {"email": user_email, "password": "newpass123"},
         )
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn("access", res.data)
         self.assertIn("refresh", res.data)
+        # the token is single use
+        res = self.client.post(reverse("user:set_password"), set_password)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autogenerated_user_has_no_password(self):
+        """Test that the autogenerated user is inserted once without a password"""
+        payload = {
+            "name": "Test Factory",
+            "address": "Test Address",
+            "city": "Test City",
+            "country": "Test Country",
+        }
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(reverse("factory:create"), payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        user_inserts = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "core_user"')
+        ]
+        self.assertEqual(len(user_inserts), 1)
+        self.assertFalse(any('UPDATE "core_user"' in q["sql"] for q in queries))
+        user = get_user_model().objects.get(pk=res.data["user_id"])
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.factory_id, res.data["id"])
+        res = self.client.get(reverse("factory:detail", args=[res.data["id"]]))
+        self.assertNotIn("set_password_token", res.data)
 
     def test_user_count_doesnt_change_after_update_op(self):
         """Test that user count doesnt change after update op"""
@@ -296,3 +339,460 @@ class AdminUserTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # check the user count
         self.assertEqual(get_user_model().objects.count(), user_count)
+
+
+class FactoryQueryCountTests(TestCase):
+    """Test that factory endpoints run a constant number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.su)
+
+    def create_factories(self, count, start=0):
+        """Create factories with two users and two equipments each"""
+        factories = []
+        for i in range(start, start + count):
+            factory = Factory.objects.create(
+                name=f"Factory {i}",
+                address="Test Address",
+                city="Test City",
+                country="Test Country",
+            )
+            for j in range(2):
+                get_user_model().objects.create_user(
+                    email=f"user{j}@factory{i}.com",
+                    password="testpass",
+                    factory=factory,
+                )
+                Equipment.objects.create(
+                    factory=factory,
+                    name=f"Equipment {i}-{j}",
+                    description="Test Description",
+                    price=100.00,
+                    date="2021-01-01",
+                )
+            factories.append(factory)
+        return factories
+
+    def test_list_factory_query_count(self):
+        """Test that listing doesn't issue queries per factory"""
+        self.create_factories(1)
+        # ETag version, factories, users and equipments
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse("factory:list"))
+        self.assertEqual(len(res.data), 1)
+
+        self.create_factories(9, start=1)
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse("factory:list"))
+        self.assertEqual(len(res.data), 10)
+        self.assertEqual(len(res.data[0]["all_users"]), 2)
+        self.assertEqual(len(res.data[0]["equipments"]), 2)
+        self.assertEqual(res.data[0]["user_id"], res.data[0]["all_users"][0]["id"])
+
+    def test_list_factory_query_count_factory_user(self):
+        """Test that listing for a factory user uses the same budget"""
+        factory = self.create_factories(3)[0]
+        user = factory.user_set.first()
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse("factory:list"))
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]["user_email"], user.email)
+
+    def test_retrieve_factory_query_count(self):
+        """Test retrieving a factory by id"""
+        factory = self.create_factories(1)[0]
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse("factory:detail", kwargs={"pk": factory.pk}))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["equipments"]), 2)
+
+    def test_update_factory_query_count(self):
+        """Test updating a factory by id"""
+        factory = self.create_factories(1)[0]
+        # fetch, savepoint, update, version bump, release, users and equipments
+        with self.assertNumQueries(7):
+            res = self.client.patch(
+                reverse("factory:update", kwargs={"pk": factory.pk}),
+                {"name": "Test Factory Updated"},
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["all_users"]), 2)
+
+    def test_factory_without_users(self):
+        """Test that a factory without users is serialized"""
+        factory = Factory.objects.create(
+            name="Test Factory",
+            address="Test Address",
+            city="Test City",
+            country="Test Country",
+        )
+        res = self.client.get(reverse("factory:detail", kwargs={"pk": factory.pk}))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["user_id"])
+        self.assertIsNone(res.data["user_email"])
+
+
+class FactoryListPaginationTests(TestCase):
+    """Test cursor pagination and streaming on the factory list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.su)
+        self.factories = [
+            Factory.objects.create(
+                name=f"Factory {i}",
+                address="Test Address",
+                city="Test City",
+                country="Test Country",
+            )
+            for i in range(5)
+        ]
+
+    def test_list_factory_not_paginated_by_default(self):
+        """Test that the list is a plain array without page_size"""
+        res = self.client.get(reverse("factory:list"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+    def test_list_factory_cursor_pagination(self):
+        """Test walking the list with cursors ordered by id"""
+        res = self.client.get(reverse("factory:list"), {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [factory["id"] for factory in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            ids += [factory["id"] for factory in res.data["results"]]
+        self.assertEqual(ids, [factory.id for factory in self.factories])
+
+    def test_list_factory_stream(self):
+        """Test streaming the list as a JSON array"""
+        res = self.client.get(reverse("factory:list"), {"stream": "true"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        data = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(
+            [factory["id"] for factory in data],
+            [factory.id for factory in self.factories],
+        )
+
+    def test_list_factory_stream_empty(self):
+        """Test streaming an empty list"""
+        Factory.objects.all().delete()
+        res = self.client.get(reverse("factory:list"), {"stream": "1"})
+        self.assertEqual(json.loads(b"".join(res.streaming_content)), [])
+
+
+class FactorySparseFieldsTests(TestCase):
+    """Test the ?fields= parameter on factory responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.su)
+        self.factory = Factory.objects.create(
+            name="Test Factory",
+            address="Test Address",
+            city="Test City",
+            country="Test Country",
+        )
+        self.su.factory = self.factory
+        self.su.save()
+
+    def test_list_factory_fields_skip_relations(self):
+        """Test that unrequested relations are neither rendered nor queried"""
+        # ETag version and factories
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse("factory:list"), {"fields": "id,name,city"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data[0]), {"id", "name", "city"})
+
+    def test_retrieve_factory_fields_users_only(self):
+        """Test that requesting user fields only prefetches users"""
+        url = reverse("factory:detail", kwargs={"pk": self.factory.pk})
+        with self.assertNumQueries(3):
+            res = self.client.get(url, {"fields": "id,user_email"})
+        self.assertEqual(res.data, {"id": self.factory.id, "user_email": self.su.email})
+
+    def test_fields_ignored_on_update(self):
+        """Test that ?fields= doesn't drop fields from writes"""
+        res = self.client.patch(
+            reverse("factory:update", kwargs={"pk": self.factory.pk}) + "?fields=id",
+            {"name": "Test Factory Updated"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["name"], "Test Factory Updated")
+
+
+class FactoryStatsTests(TestCase):
+    """Test the factory statistics endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.factories = [
+            Factory.objects.create(
+                name=f"Factory {i}",
+                address="Test Address",
+                city="Test City",
+                country="Test Country",
+            )
+            for i in range(2)
+        ]
+        for factory in self.factories:
+            for i in range(3):
+                equipment = Equipment.objects.create(
+                    factory=factory,
+                    name=f"{factory.name} Equipment {i}",
+                    description="Test Description",
+                    price=100.00,
+                    date=f"2021-0{i + 1}-01",
+                    status=i > 0,
+                )
+                for j in range(i):
+                    equipment.property_set.create(
+                        name=f"{equipment.name} Property {j}", description="d"
+                    )
+        self.ru = get_user_model().objects.create_user(
+            email="ru@test.com", password="testpass", factory=self.factories[0]
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        # the rows above bypass the API hooks maintaining the rollups
+        FactoryStats.objects.rebuild()
+
+    def test_factory_stats(self):
+        """Test the statistics of one factory in a single query"""
+        self.client.force_authenticate(self.ru)
+        url = reverse("factory:detail_stats", kwargs={"pk": self.factories[0].pk})
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            {
+                "equipment_count": 3,
+                "active_equipment_count": 2,
+                "total_price": 300.0,
+                "first_date": "2021-01-01",
+                "last_date": "2021-03-01",
+                "property_count": 3,
+            },
+        )
+
+    def test_factory_stats_other_factory(self):
+        """Test that users can't read the statistics of other factories"""
+        self.client.force_authenticate(self.ru)
+        url = reverse("factory:detail_stats", kwargs={"pk": self.factories[1].pk})
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_factory_stats_not_found(self):
+        """Test the statistics of a missing factory"""
+        self.client.force_authenticate(self.su)
+        res = self.client.get(reverse("factory:detail_stats", kwargs={"pk": 999}))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fleet_stats(self):
+        """Test the statistics of all factories for admins"""
+        self.client.force_authenticate(self.su)
+        res = self.client.get(reverse("factory:stats"))
+        self.assertEqual(res.data["equipment_count"], 6)
+        self.assertEqual(res.data["property_count"], 6)
+        self.assertEqual(res.data["total_price"], 600.0)
+
+    def test_fleet_stats_factory_user(self):
+        """Test that factory users only see their factory"""
+        self.client.force_authenticate(self.ru)
+        res = self.client.get(reverse("factory:stats"))
+        self.assertEqual(res.data["equipment_count"], 3)
+
+    @override_settings(STATS_CACHE_TIMEOUT=60)
+    def test_factory_stats_cached(self):
+        """Test that cached statistics skip the database"""
+        cache.clear()
+        self.client.force_authenticate(self.ru)
+        url = reverse("factory:detail_stats", kwargs={"pk": self.factories[0].pk})
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+        self.assertEqual(res.data["equipment_count"], 3)
+        cache.clear()
+
+    @override_settings(STATS_CACHE_TIMEOUT=60)
+    def test_cached_stats_invalidated(self):
+        """Test that equipment changes invalidate the cached statistics"""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        detail_url = reverse(
+            "factory:detail_stats", kwargs={"pk": self.factories[0].pk}
+        )
+        fleet_url = reverse("factory:stats")
+        self.client.force_authenticate(self.su)
+        self.assertEqual(self.client.get(detail_url).data["equipment_count"], 3)
+        self.assertEqual(self.client.get(fleet_url).data["equipment_count"], 6)
+
+        self.client.force_authenticate(self.ru)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("equipment:create"),
+                {
+                    "name": "New equipment",
+                    "description": "Description",
+                    "price": 100.00,
+                    "date": "2021-01-01",
+                },
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(self.su)
+        self.assertEqual(self.client.get(detail_url).data["equipment_count"], 4)
+        self.assertEqual(self.client.get(fleet_url).data["equipment_count"], 7)
+
+
+class FactoryETagTests(TestCase):
+    """Test conditional GETs of the factory and equipment endpoints"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        self.equipment = Equipment.objects.create(
+            factory=self.factory,
+            name="Equipment",
+            description="Description",
+            price=100.00,
+            date="2021-01-01",
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.su)
+        self.url = reverse("factory:detail", kwargs={"pk": self.factory.pk})
+
+    def test_not_modified(self):
+        """Test that a matching If-None-Match skips the serializer"""
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(res["ETag"], etag)
+
+    def test_equipment_write_changes_etag(self):
+        """Test that an equipment update changes the ETag of its factory"""
+        etag = self.client.get(self.url)["ETag"]
+        self.client.patch(
+            reverse("equipment:update", args=[self.equipment.id]), {"price": 50}
+        )
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_user_write_changes_etag(self):
+        """Test that adding a user to the factory changes its ETag"""
+        etag = self.client.get(self.url)["ETag"]
+        self.client.patch(
+            reverse("user:update", args=[self.su.id]), {"factory": self.factory.id}
+        )
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_representation(self):
+        """Test that sparse field sets get their own ETags"""
+        etag = self.client.get(self.url)["ETag"]
+        res = self.client.get(self.url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes_with_new_factory(self):
+        """Test that creating a factory changes the ETag of the list"""
+        url = reverse("factory:list")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        Factory.objects.create(
+            name="Other", address="Address", city="City", country="Country"
+        )
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_equipment_list_not_modified(self):
+        """Test conditional GETs of the equipment list"""
+        url = reverse("equipment:list", args=[self.factory.id])
+        etag = self.client.get(url)["ETag"]
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=60)
+    def test_not_modified_from_response_cache(self):
+        """Test that cached responses answer conditional GETs without queries"""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class FactoryValuesSerializerTests(TestCase):
+    """Test that the factory list fast path matches FactorySerializer"""
+
+    def setUp(self):
+        for i in range(3):
+            factory = Factory.objects.create(
+                name=f"Factory {i}", address="Adres", city="İzmir", country="Türkiye"
+            )
+            for j in range(i):
+                get_user_model().objects.create_user(
+                    email=f"user{i}-{j}@test.com",
+                    password="testpass",
+                    factory=factory,
+                    is_staff=j == 0,
+                )
+                Equipment.objects.create(
+                    factory=factory,
+                    name=f"Equipment {i}-{j}",
+                    description="Description",
+                    price=j * 2.5,
+                    date=f"2021-0{j + 1}-01",
+                    status=j == 0,
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="su@test.com", password="testpass"
+            )
+        )
+
+    def assertSameAsSerializer(self, params):
+        url = reverse("factory:list")
+        res = self.client.get(url, params)
+        request = Request(APIRequestFactory().get(url, params))
+        expected = FactorySerializer(
+            Factory.objects.order_by("id"), many=True, context={"request": request}
+        ).data
+        self.assertEqual(res.content, JSONRenderer().render(expected))
+
+    def test_parity(self):
+        """Test the full and sparse lists, with factories without users"""
+        self.assertSameAsSerializer({})
+        self.assertSameAsSerializer({"fields": "id,user_email"})
+        self.assertSameAsSerializer({"fields": "name,all_users,equipments"})
+        self.assertSameAsSerializer({"fields": "city"})
+
+    def test_paginated_parity(self):
+        res = self.client.get(reverse("factory:list"), {"page_size": 2})
+        expected = FactorySerializer(Factory.objects.order_by("id")[:2], many=True)
+        self.assertEqual(res.data["results"], expected.data)
@@ -10,6 +10,8 @@ urlpatterns = [
         "", views.ListFactoryView.as_view(), name="list"
     ),  # If admin user, list all factories. If factory user, list only their factories.
     path("update/<int:pk>/", views.UpdateFactoryByIdView.as_view(), name="update"),
+    path("stats/", views.FleetStatsView.as_view(), name="stats"),
+    path("<int:pk>/stats/", views.FactoryStatsView.as_view(), name="detail_stats"),
     # Admin User
     path("create/", views.CreateFactoryView.as_view(), name="create"),
     path("<int:pk>/", views.RetrieveFactoryByIdView.as_view(), name="detail"),
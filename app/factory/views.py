@@ -1,42 +1,145 @@
 from django.shortcuts import render
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-
-from core.models import Factory
-from factory.serializers import FactorySerializer
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+
+from core.cache import (
+    CachedResponseMixin,
+    ETagMixin,
+    get_cache,
+    get_generations,
+    invalidate,
+    invalidate_factories,
+)
+from core.models import STATS_FIELDS, Factory, FactoryStats
+from core.pagination import IdCursorPagination
+from core.renderers import ORJSONRenderer
+from core.views import AsyncReadMixin, ValuesListMixin
+from equipment.views import IsFactoryMember
+from factory.serializers import (
+    CreateFactorySerializer,
+    FactorySerializer,
+    FactoryStatsSerializer,
+    FactoryValuesSerializer,
+)
+from user.authentication import mark_users_changed
+
+
+STREAM_CHUNK_SIZE = 200
 
 
 # Create your views here.
-class ListFactoryView(generics.ListAPIView):
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            "stream", bool, description="Stream all factories as a JSON array"
+        ),
+    ]
+)
+class ListFactoryView(
+    CachedResponseMixin,
+    ETagMixin,
+    AsyncReadMixin,
+    ValuesListMixin,
+    generics.ListAPIView,
+):
+    """List factories, optionally paginated by id or streamed"""
+
     serializer_class = FactorySerializer
+    values_serializer_class = FactoryValuesSerializer
     permission_classes = [IsAuthenticated]
-    def get_queryset(self):
+    pagination_class = IdCursorPagination
+
+    def get_cache_scopes(self):
+        user = self.request.user
+        return ["factories"] if user.is_staff else [f"factory:{user.factory_id}"]
+
+    def get_etag_version(self):
+        return self.get_factories().version()
+
+    async def aget_etag_version(self):
+        return await self.get_factories().aversion()
+
+    def get_factories(self):
         user = self.request.user
         if user.is_staff:
             return Factory.objects.all()
         else:
-            return Factory.objects.filter(user=user)
-
+            return Factory.objects.filter(pk=user.factory_id)
 
-class RetrieveFactoryByIdView(generics.RetrieveAPIView):
+    def get_queryset(self):
+        relations = self.get_serializer().get_relations()
+        return self.get_factories().with_related(**relations)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") not in ("1", "true"):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).order_by("id")
+        # ASGI servers consume sync iterators whole, give them an async one
+        if isinstance(request._request, ASGIRequest):
+            stream = self.astream_factories(queryset)
+        else:
+            stream = self.stream_factories(queryset)
+        return StreamingHttpResponse(stream, content_type="application/json")
+
+    def stream_factories(self, queryset):
+        """Yield the factories as a JSON array, one chunk of rows at a time"""
+        renderer = ORJSONRenderer()
+        yield b"["
+        for i, factory in enumerate(queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)):
+            data = renderer.render(self.get_serializer(factory).data)
+            yield data if i == 0 else b"," + data
+        yield b"]"
+
+    async def astream_factories(self, queryset):
+        """Async stream_factories()"""
+        renderer = ORJSONRenderer()
+        yield b"["
+        separator = b""
+        async for factory in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+            yield separator + renderer.render(self.get_serializer(factory).data)
+            separator = b","
+        yield b"]"
+
+
+class RetrieveFactoryByIdView(
+    CachedResponseMixin, ETagMixin, AsyncReadMixin, generics.RetrieveAPIView
+):
     """For admin user, retrieve factory by id. For factory user, retrieve only their factories by id."""
 
     serializer_class = FactorySerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
-    queryset = Factory.objects.all()
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    def get_cache_scopes(self):
+        return [f"factory:{self.kwargs.get('pk')}"]
+
+    def get_etag_version(self):
+        return Factory.objects.filter(pk=self.kwargs.get("pk")).version()
+
+    async def aget_etag_version(self):
+        return await Factory.objects.filter(pk=self.kwargs.get("pk")).aversion()
+
+    def get_queryset(self):
+        return Factory.objects.with_related(**self.get_serializer().get_relations())
+
 
 class CreateFactoryView(generics.CreateAPIView):
     """Create a new factory"""
 
-    serializer_class = FactorySerializer
+    serializer_class = CreateFactorySerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def perform_create(self, serializer):
         serializer.save()
+        invalidate_factories([])
 
 
 class UpdateFactoryByIdView(generics.UpdateAPIView):
@@ -50,13 +153,17 @@ class UpdateFactoryByIdView(generics.UpdateAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        # DRF drops the prefetch cache after saving, the serializer refetches
         if user.is_staff:
             return Factory.objects.all()
         else:
-            return Factory.objects.filter(user=user)
+            return Factory.objects.filter(pk=user.factory_id)
 
+    @transaction.atomic
     def perform_update(self, serializer):
-        serializer.save()
+        factory = serializer.save()
+        Factory.objects.filter(pk=factory.pk).bump_version()
+        invalidate_factories([factory.pk])
 
 
 class DeleteFactoryByIdView(generics.DestroyAPIView):
@@ -68,4 +175,75 @@ class DeleteFactoryByIdView(generics.DestroyAPIView):
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # the users of the factory are deleted with it
+        user_ids = list(instance.user_set.values_list("pk", flat=True))
+        invalidate(*(f"user:{pk}" for pk in user_ids))
+        invalidate_factories([instance.pk])
+        instance.delete()
+        # their access tokens stop authenticating once the delete commits
+        transaction.on_commit(lambda: mark_users_changed(user_ids))
+
+
+class FactoryStatsMixin:
+    """Read equipment statistics from the rollups, cached when configured
+
+    Cached statistics are keyed on the generations of their cache scopes,
+    so the writes invalidating the factory responses invalidate them too.
+    """
+
+    serializer_class = FactoryStatsSerializer
+
+    def get_stats(self, scopes, compute):
+        timeout = settings.STATS_CACHE_TIMEOUT
+        if not timeout:
+            return compute()
+        generations = get_generations(scopes)
+        cache_key = "factory-stats:" + ":".join(
+            f"{scope}@{generation}" for scope, generation in zip(scopes, generations)
+        )
+        stats = get_cache().get(cache_key)
+        if stats is None:
+            stats = compute()
+            if stats is not None:
+                get_cache().set(cache_key, stats, timeout)
+        return stats
+
+    def get_factory_stats(self, pk):
+        return self.get_stats(
+            [f"factory:{pk}"], Factory.objects.filter(pk=pk).stats().first
+        )
+
+
+class FactoryStatsView(FactoryStatsMixin, generics.GenericAPIView):
+    """Statistics of the equipment of a factory"""
 
+    permission_classes = [IsAuthenticated, IsFactoryMember]
+    factory_url_kwarg = "pk"
+
+    @extend_schema(operation_id="factory_detail_stats_retrieve")
+    def get(self, request, pk):
+        stats = self.get_factory_stats(pk)
+        if stats is None:
+            raise Http404
+        return Response(self.get_serializer(stats).data)
+
+
+class FleetStatsView(FactoryStatsMixin, generics.GenericAPIView):
+    """Statistics of the equipment of all factories the user can see"""
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(operation_id="factory_stats_retrieve")
+    def get(self, request):
+        user = request.user
+        if user.is_staff:
+            stats = self.get_stats(["factories"], FactoryStats.objects.totals)
+        else:
+            stats = self.get_factory_stats(user.factory_id) or {
+                **dict.fromkeys(STATS_FIELDS, 0),
+                "first_date": None,
+                "last_date": None,
+            }
+        return Response(self.get_serializer(stats).data)
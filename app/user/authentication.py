@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt import settings as jwt_settings
+from rest_framework_simplejwt.models import TokenUser
+
+from core.db import use_primary_if_pinned
+
+
+def get_revocation_cache():
+    return caches[settings.REVOCATION_CACHE_ALIAS]
+
+
+def user_changed_key(user_id):
+    return f"user-changed:{user_id}"
+
+
+def mark_user_changed(user_id):
+    """Make stateless authentication load the user until its tokens renew"""
+    mark_users_changed([user_id])
+
+
+def mark_users_changed(user_ids):
+    # access tokens issued before now expire within their lifetime
+    lifetime = jwt_settings.api_settings.ACCESS_TOKEN_LIFETIME
+    changed_at = int(time.time())
+    get_revocation_cache().set_many(
+        {user_changed_key(user_id): changed_at for user_id in user_ids},
+        int(lifetime.total_seconds()),
+    )
+
+
+def user_changed_since(user_id, issued_at):
+    """Return whether the user changed since a token issued at issued_at"""
+    changed_at = get_revocation_cache().get(user_changed_key(user_id))
+    # iat has a one second resolution, a change in the same second counts
+    return changed_at is not None and changed_at >= issued_at
+
+
+class FactoryTokenUser(TokenUser):
+    """Token backed user that also carries the user's factory"""
+
+    @cached_property
+    def factory_id(self):
+        return self.token.get("factory_id")
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """JWT authentication that skips the user lookup in stateless mode
+
+    With settings.JWT_STATELESS_AUTH safe requests build the user from the
+    token claims instead of fetching the user row. Writes still load the
+    user, and so do requests of users changed since their token was issued,
+    see mark_user_changed(). Users who just wrote read from the primary,
+    see core.db.
+    """
+
+    def authenticate(self, request):
+        self.request = request
+        result = super().authenticate(request)
+        if result is not None and settings.DATABASE_REPLICAS:
+            use_primary_if_pinned(result[0])
+        return result
+
+    def get_user(self, validated_token):
+        if settings.JWT_STATELESS_AUTH and not self.needs_user_lookup(validated_token):
+            return authentication.JWTStatelessUserAuthentication.get_user(
+                self, validated_token
+            )
+        return super().get_user(validated_token)
+
+    def needs_user_lookup(self, validated_token):
+        """Return whether the claims of the token can't be trusted as is"""
+        if self.request.method not in SAFE_METHODS:
+            return True
+        user_id = validated_token.get(jwt_settings.api_settings.USER_ID_CLAIM)
+        return user_changed_since(user_id, validated_token.get("iat", 0))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+
+UserModel = get_user_model()
+
+
+def credentials_cache_key(user, password):
+    # keyed with SECRET_KEY and the stored hash, a password change or a
+    # leaked cache doesn't give the password away
+    digest = salted_hmac(
+        "user.backends.credentials",
+        f"{user.pk}:{user.password}:{password}",
+        algorithm="sha256",
+    ).hexdigest()
+    return f"credentials:{digest}"
+
+
+class CachedCredentialsBackend(ModelBackend):
+    """ModelBackend remembering successful password checks
+
+    See settings.CREDENTIALS_CACHE_TIMEOUT. Checks that do hash the password
+    rehash it when the hasher settings changed.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        timeout = settings.CREDENTIALS_CACHE_TIMEOUT
+        if not timeout:
+            return super().authenticate(request, username, password, **kwargs)
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash anyway, like ModelBackend, to not reveal unknown users
+            UserModel().set_password(password)
+            return None
+        if not self.user_can_authenticate(user):
+            return None
+        if cache.get(credentials_cache_key(user, password)):
+            return user
+        if user.check_password(password):
+            # keyed with the hash check_password() may just have upgraded
+            cache.set(credentials_cache_key(user, password), True, timeout)
+            return user
+        return None
@@ -0,0 +1,127 @@
+import base64
+import functools
+import hashlib
+import json
+
+import jwt
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms
+from rest_framework_simplejwt import settings as jwt_settings
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+
+
+# members of each key type hashed into its RFC 7638 thumbprint
+THUMBPRINT_MEMBERS = {
+    "RSA": ("e", "kty", "n"),
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+}
+
+
+def public_jwk(public_key, algorithm):
+    """Return the JWK of a public key, identified by its thumbprint"""
+    jwk = json.loads(get_default_algorithms()[algorithm].to_jwk(public_key))
+    canonical = json.dumps(
+        {name: jwk[name] for name in THUMBPRINT_MEMBERS[jwk["kty"]]},
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(canonical.encode()).digest()
+    kid = base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+    return {**jwk, "kid": kid, "alg": algorithm, "use": "sig"}
+
+
+def load_private_key(path):
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+    with open(path, "rb") as file:
+        return load_pem_private_key(file.read(), password=None)
+
+
+def load_public_key(path):
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+    with open(path, "rb") as file:
+        return load_pem_public_key(file.read())
+
+
+class KeySetTokenBackend(TokenBackend):
+    """TokenBackend signing with one private key and verifying by key id
+
+    Tokens carry the key id in their kid header. Verifying keys are parsed
+    once per process, a token is checked against the key it names.
+    """
+
+    def __init__(self, algorithm, signing_key, verifying_keys, **kwargs):
+        super().__init__(algorithm, signing_key, **kwargs)
+        self.signing_jwk = public_jwk(signing_key.public_key(), algorithm)
+        self.verifying_keys = {self.signing_jwk["kid"]: signing_key.public_key()}
+        self.jwks = [self.signing_jwk]
+        for key in verifying_keys:
+            jwk = public_jwk(key, algorithm)
+            self.verifying_keys[jwk["kid"]] = key
+            self.jwks.append(jwk)
+
+    def _validate_algorithm(self, algorithm):
+        # PyJWT supports EdDSA, simplejwt 5.3 doesn't list it
+        if algorithm != "EdDSA":
+            super()._validate_algorithm(algorithm)
+
+    def get_verifying_key(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as exc:
+            raise TokenBackendError(_("Token is invalid or expired")) from exc
+        if kid not in self.verifying_keys:
+            raise TokenBackendError(_("Token is invalid or expired"))
+        return self.verifying_keys[kid]
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+        return jwt.encode(
+            jwt_payload,
+            self.signing_key,
+            algorithm=self.algorithm,
+            headers={"kid": self.signing_jwk["kid"]},
+            json_encoder=self.json_encoder,
+        )
+
+
+@functools.cache
+def get_token_backend():
+    """Return the token backend for SIMPLE_JWT["ALGORITHM"]
+
+    HMAC algorithms keep simplejwt's backend and SIGNING_KEY, the others
+    sign with settings.JWT_PRIVATE_KEY_FILE.
+    """
+    if jwt_settings.api_settings.ALGORITHM.startswith("HS"):
+        return import_string("rest_framework_simplejwt.state.token_backend")
+    return KeySetTokenBackend(
+        jwt_settings.api_settings.ALGORITHM,
+        load_private_key(settings.JWT_PRIVATE_KEY_FILE),
+        [load_public_key(path) for path in settings.JWT_PUBLIC_KEY_FILES],
+        audience=jwt_settings.api_settings.AUDIENCE,
+        issuer=jwt_settings.api_settings.ISSUER,
+        leeway=jwt_settings.api_settings.LEEWAY,
+        json_encoder=jwt_settings.api_settings.JSON_ENCODER,
+    )
+
+
+def get_jwks():
+    """Return the JSON Web Key Set of the keys verifying our tokens"""
+    backend = get_token_backend()
+    return {"keys": getattr(backend, "jwks", [])}
+
+
+@receiver(setting_changed)
+def reset_token_backend(setting, **kwargs):
+    if setting in ("SIMPLE_JWT", "JWT_PRIVATE_KEY_FILE", "JWT_PUBLIC_KEY_FILES"):
+        get_token_backend.cache_clear()
@@ -1,14 +1,55 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+from drf_spectacular.utils import extend_schema_field
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer,
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import settings as jwt_settings
 
+from core.serializers import DynamicFieldsMixin, ValuesSerializer
+from user.tokens import RefreshToken
 
-class UserSerializer(serializers.ModelSerializer):
+
+def factory_summary(factory):
+    if factory is None:
+        return None
+    return {
+        "id": factory.id,
+        "name": factory.name,
+        "city": factory.city,
+        "country": factory.country,
+    }
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for the users object"""
 
+    factory_summary = serializers.SerializerMethodField(
+        help_text="Name and location of the user's factory"
+    )
+
     class Meta:
         model = get_user_model()
-        fields = ("email", "password", "name", "surname", "is_staff", "is_superuser", "factory")
+        fields = (
+            "email",
+            "password",
+            "name",
+            "surname",
+            "is_staff",
+            "is_superuser",
+            "factory",
+            "factory_summary",
+        )
         extra_kwargs = {"password": {"write_only": True, "min_length": 5}}
+        expandable_fields = ("factory_summary",)
+
+    @extend_schema_field(dict)
+    def get_factory_summary(self, obj):
+        return factory_summary(obj.factory)
 
     def create(self, validated_data):
         """Create a new user with encrypted password and return it."""
@@ -24,3 +65,145 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class SetPasswordSerializer(serializers.Serializer):
+    """Serializer setting a password with a one-time token"""
+
+    user_id = serializers.IntegerField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True, min_length=5)
+
+    def validate(self, attrs):
+        user = get_user_model().objects.filter(pk=attrs["user_id"]).first()
+        # the token covers the current password, it stops working once used
+        if user is None or not default_token_generator.check_token(
+            user, attrs["token"]
+        ):
+            raise serializers.ValidationError("Invalid or expired token")
+        attrs["user"] = user
+        return attrs
+
+    def save(self):
+        user = self.validated_data["user"]
+        user.set_password(self.validated_data["password"])
+        user.save(update_fields=["password"])
+        return user
+
+
+class UserValuesSerializer(ValuesSerializer):
+    """Read-only UserSerializer for list responses"""
+
+    columns = {
+        "email": "email",
+        "name": "name",
+        "surname": "surname",
+        "is_staff": "is_staff",
+        "is_superuser": "is_superuser",
+        "factory": "factory_id",
+    }
+    summary_columns = {
+        "id": "factory_id",
+        "name": "factory__name",
+        "city": "factory__city",
+        "country": "factory__country",
+    }
+
+    def get_queryset(self, queryset):
+        rows = super().get_queryset(queryset)
+        if "factory_summary" in self.field_names:
+            # joined into the same query, like select_related("factory")
+            columns = [*rows.query.values_select, *self.summary_columns.values()]
+            rows = rows.values(*dict.fromkeys(columns))
+        return rows
+
+    def add_relations(self, rows, data):
+        if "factory_summary" not in self.field_names:
+            return
+        for row, item in zip(rows, data):
+            item["factory_summary"] = None
+            if row["factory_id"] is not None:
+                item["factory_summary"] = {
+                    key: row[column] for key, column in self.summary_columns.items()
+                }
+
+
+class UserFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters filtering user lists"""
+
+    factory = serializers.IntegerField(required=False)
+    is_staff = serializers.BooleanField(required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    LOOKUPS = {
+        "factory": "factory_id",
+        "is_staff": "is_staff",
+        "is_active": "is_active",
+    }
+
+    def get_filters(self):
+        """Return the queryset filter kwargs of the validated parameters"""
+        return {self.LOOKUPS[key]: value for key, value in self.validated_data.items()}
+
+
+class FactoryTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token serializer adding the claims used by stateless authentication"""
+
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_user_claims(token, user)
+        return token
+
+
+def set_user_claims(token, user):
+    """Set the claims used by stateless authentication"""
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+    token["factory_id"] = user.factory_id
+
+
+class FactoryTokenRefreshSerializer(TokenRefreshSerializer):
+    """Token refresh serializer rejecting rotated refresh tokens
+
+    The user is loaded again, refreshes of inactive or deleted users fail
+    and the new tokens carry the current claims.
+    """
+
+    token_class = RefreshToken
+    default_error_messages = {
+        "no_active_account": _("No active account found with the given credentials")
+    }
+
+    def validate(self, attrs):
+        api_settings = jwt_settings.api_settings
+        refresh = self.token_class(attrs["refresh"])
+        user_id = refresh[api_settings.USER_ID_CLAIM]
+        user = (
+            get_user_model()
+            .objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .first()
+        )
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+        set_user_claims(refresh, user)
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
+
+
+class FactoryTokenBlacklistSerializer(TokenBlacklistSerializer):
+    """Serializer revoking a refresh token on logout"""
+
+    token_class = RefreshToken
@@ -1,8 +1,31 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import jwt
+from django.core.management import call_command
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Factory
+from user.authentication import get_revocation_cache
+from user.serializers import UserSerializer
+from user.tokens import RefreshToken
 
 
 
@@ -115,6 +138,12 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn("email", res.data)
 
+    def test_retrieve_user_fields(self):
+        """Test limiting the profile to the requested fields"""
+        res = self.client.get(reverse("user:me"), {"fields": "email,name"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {"email", "name"})
+
     def test_retrieve_user_by_id(self):
         """Test retrieving user by id"""
         res = self.client.get(reverse("user:detail", kwargs={"pk": self.ru.pk}))
@@ -162,3 +191,542 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
             
+
+
+class StatelessAuthenticationTests(TestCase):
+    """Test authenticating from the token claims only"""
+
+    def setUp(self):
+        get_revocation_cache().clear()
+        self.client = APIClient()
+        self.factory = Factory.objects.create(
+            name="Test Factory",
+            address="Test Address",
+            city="Test City",
+            country="Test Country",
+        )
+        self.ru = get_user_model().objects.create_user(
+            email="ru@test.com",
+            password="regularuser",
+            name="Regular",
+            surname="User",
+            factory=self.factory,
+        )
+        res = self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "ru@test.com", "password": "regularuser"},
+        )
+        self.access = res.data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+
+    def test_token_contains_claims(self):
+        """Test that the access token carries role and factory claims"""
+        token = AccessToken(self.access)
+        self.assertEqual(token["factory_id"], self.factory.id)
+        self.assertFalse(token["is_staff"])
+        self.assertFalse(token["is_superuser"])
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_stateless_skips_user_lookup(self):
+        """Test that no user row is fetched in stateless mode"""
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse("factory:list"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["id"], self.factory.id)
+
+    @override_settings(JWT_STATELESS_AUTH=False)
+    def test_stateful_fetches_user(self):
+        """Test that the user row is fetched by default"""
+        with self.assertNumQueries(5):
+            res = self.client.get(reverse("factory:list"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_stateless_retrieve_user(self):
+        """Test that the profile endpoint still returns the user"""
+        res = self.client.get(reverse("user:me"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.ru.email)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_stateless_retrieve_missing_user(self):
+        """Test that the profile of a user deleted behind the API is a 404"""
+        get_user_model().objects.filter(pk=self.ru.pk).delete()
+        res = self.client.get(reverse("user:me"))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_factory_delete_revokes_users(self):
+        """Test that the tokens of a deleted factory's users stop working"""
+        admin = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = admin_client.delete(reverse("factory:delete", args=[self.factory.id]))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        res = self.client.get(reverse("factory:list"))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_stateless_staff_checks_use_claims(self):
+        """Test that admin endpoints are denied from the claims"""
+        res = self.client.get(reverse("user:list"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class StatelessRevocationTests(TestCase):
+    """Test that user changes reach stateless authentication before token expiry"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_revocation_cache().clear()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com", password="testpass", is_staff=True
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        res = APIClient().post(
+            reverse("user:token_obtain_pair"),
+            {"email": "admin@test.com", "password": "testpass"},
+        )
+        self.refresh = res.data["refresh"]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+
+    def demote(self):
+        su_client = APIClient()
+        su_client.force_authenticate(self.su)
+        res = su_client.patch(
+            reverse("user:update", args=[self.admin.id]), {"is_staff": False}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_changed_user_is_loaded(self):
+        """Test that a demoted user loses access with their current token"""
+        self.assertEqual(
+            self.client.get(reverse("user:list")).status_code, status.HTTP_200_OK
+        )
+        self.demote()
+        res = self.client.get(reverse("user:list"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_writes_load_user(self):
+        """Test that writes check the user row, not the claims"""
+        get_user_model().objects.filter(pk=self.admin.pk).update(is_active=False)
+        res = self.client.post(
+            CREATE_USER_URL, {"email": "new@test.com", "password": "testpass"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_reloads_claims(self):
+        """Test that refreshed tokens carry the current role"""
+        self.demote()
+        res = self.client.post(reverse("user:token_refresh"), {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(AccessToken(res.data["access"])["is_staff"])
+        self.assertFalse(RefreshToken(res.data["refresh"])["is_staff"])
+
+    def test_refresh_inactive_user(self):
+        """Test that inactive and deleted users can't refresh"""
+        get_user_model().objects.filter(pk=self.admin.pk).update(is_active=False)
+        res = self.client.post(reverse("user:token_refresh"), {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserValuesSerializerTests(TestCase):
+    """Test that the user list fast path matches UserSerializer"""
+
+    def setUp(self):
+        factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        get_user_model().objects.create_user(
+            email="ru@test.com", password="testpass", name="Çağla", factory=factory
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.su)
+
+    def assertSameAsSerializer(self, params):
+        url = reverse("user:list")
+        res = self.client.get(url, params)
+        request = Request(APIRequestFactory().get(url, params))
+        expected = UserSerializer(
+            get_user_model().objects.all(), many=True, context={"request": request}
+        ).data
+        self.assertEqual(res.content, JSONRenderer().render(expected))
+
+    def test_parity(self):
+        self.assertSameAsSerializer({})
+        self.assertSameAsSerializer({"fields": "email,factory"})
+        self.assertSameAsSerializer({"expand": "factory_summary"})
+
+
+class ListUserTests(TestCase):
+    """Test the scope, filters and pagination of the user list"""
+
+    def setUp(self):
+        self.factory = Factory.objects.create(
+            name="Factory", address="Address", city="City", country="Country"
+        )
+        other = Factory.objects.create(
+            name="Other", address="Address", city="City", country="Country"
+        )
+        self.su = get_user_model().objects.create_superuser(
+            email="su@test.com", password="testpass"
+        )
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.com",
+            password="testpass",
+            factory=self.factory,
+            is_staff=True,
+        )
+        for i in range(3):
+            get_user_model().objects.create_user(
+                email=f"user{i}@test.com", password="testpass", factory=self.factory
+            )
+        get_user_model().objects.create_user(
+            email="inactive@test.com",
+            password="testpass",
+            factory=self.factory,
+            is_active=False,
+        )
+        get_user_model().objects.create_user(
+            email="other@test.com", password="testpass", factory=other
+        )
+        self.client = APIClient()
+
+    def emails(self, res):
+        results = res.data["results"] if "results" in res.data else res.data
+        return [user["email"] for user in results]
+
+    def test_factory_admin_scope(self):
+        """Test that a factory admin lists their factory's users in one query"""
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("user:list"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+        self.assertNotIn("other@test.com", self.emails(res))
+
+    def test_filters(self):
+        """Test filtering by factory, staff and active flags"""
+        self.client.force_authenticate(self.su)
+        url = reverse("user:list")
+        res = self.client.get(url, {"factory": self.factory.id, "is_active": "false"})
+        self.assertEqual(self.emails(res), ["inactive@test.com"])
+        res = self.client.get(url, {"is_staff": "true"})
+        self.assertEqual(self.emails(res), ["su@test.com", "admin@test.com"])
+        res = self.client.get(url, {"factory": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filters_stay_in_scope(self):
+        """Test that a factory filter doesn't widen a factory admin's scope"""
+        self.client.force_authenticate(self.admin)
+        other = get_user_model().objects.get(email="other@test.com")
+        res = self.client.get(reverse("user:list"), {"factory": other.factory_id})
+        self.assertEqual(res.data, [])
+
+    def test_pagination(self):
+        """Test paging through the users by id"""
+        self.client.force_authenticate(self.su)
+        res = self.client.get(reverse("user:list"), {"page_size": 4})
+        emails = self.emails(res)
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            emails += self.emails(res)
+        expected = (
+            get_user_model().objects.order_by("id").values_list("email", flat=True)
+        )
+        self.assertEqual(emails, list(expected))
+
+    def test_factory_summary(self):
+        """Test that the embedded factory comes from the same query"""
+        self.client.force_authenticate(self.su)
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("user:list"), {"expand": "factory_summary"})
+        summaries = {user["email"]: user["factory_summary"] for user in res.data}
+        self.assertIsNone(summaries["su@test.com"])
+        self.assertEqual(
+            summaries["admin@test.com"],
+            {
+                "id": self.factory.id,
+                "name": "Factory",
+                "city": "City",
+                "country": "Country",
+            },
+        )
+
+
+class SetPasswordTests(TestCase):
+    """Test setting a password with a one-time token"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password=None
+        )
+        self.client = APIClient()
+
+    def set_password(self, token, password="newpass123"):
+        return self.client.post(
+            reverse("user:set_password"),
+            {"user_id": self.user.id, "token": token, "password": password},
+        )
+
+    def test_set_password(self):
+        """Test that a valid token sets the password"""
+        res = self.set_password(default_token_generator.make_token(self.user))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("newpass123"))
+
+    def test_invalid_token(self):
+        """Test that a wrong token leaves the password unusable"""
+        res = self.set_password("wrong-token")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_usable_password())
+
+    def test_short_password(self):
+        """Test that the password length is validated like on create"""
+        res = self.set_password(default_token_generator.make_token(self.user), "pw")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(PASSWORD_HASHER_COST=1000)
+class PasswordHashingTests(TestCase):
+    """Test the password hasher profile and the token endpoint logins"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+        self.client = APIClient()
+
+    def login(self, password="testpass"):
+        return self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": password},
+        )
+
+    def stored_hash(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_cost_from_settings(self):
+        """Test that new hashes use the configured cost"""
+        self.assertTrue(self.stored_hash().startswith("pbkdf2_sha256$1000$"))
+
+    def test_rehash_on_login_after_cost_change(self):
+        """Test that a login upgrades a hash made with another cost"""
+        with override_settings(PASSWORD_HASHER_COST=2000):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertTrue(self.stored_hash().startswith("pbkdf2_sha256$2000$"))
+
+    @override_settings(
+        PASSWORD_HASHER="scrypt",
+        PASSWORD_HASHER_COST=2**10,
+        PASSWORD_HASHERS=[
+            "core.hashers.ScryptPasswordHasher",
+            "core.hashers.PBKDF2PasswordHasher",
+        ],
+    )
+    def test_rehash_on_login_after_hasher_change(self):
+        """Test that a login moves the hash to the preferred hasher"""
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        hasher = identify_hasher(self.stored_hash())
+        self.assertEqual(hasher.algorithm, "scrypt")
+        self.assertEqual(hasher.decode(self.stored_hash())["work_factor"], 2**10)
+
+    @override_settings(CREDENTIALS_CACHE_TIMEOUT=60)
+    def test_credentials_cache(self):
+        """Test that a repeated login skips the password hasher"""
+        with mock.patch.object(
+            get_user_model(),
+            "check_password",
+            autospec=True,
+            side_effect=get_user_model().check_password,
+        ) as check_password:
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                self.login("wrongpass").status_code, status.HTTP_401_UNAUTHORIZED
+            )
+        self.assertEqual(check_password.call_count, 2)
+
+    @override_settings(CREDENTIALS_CACHE_TIMEOUT=60)
+    def test_credentials_cache_follows_password_changes(self):
+        """Test that a changed password invalidates the remembered check"""
+        self.login()
+        self.user.set_password("newpass")
+        self.user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login("newpass").status_code, status.HTTP_200_OK)
+
+    @override_settings(CREDENTIALS_CACHE_TIMEOUT=60)
+    def test_credentials_cache_inactive_user(self):
+        """Test that deactivated users can't log in with a remembered password"""
+        self.login()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RefreshTokenRotationTests(TestCase):
+    """Test that rotated and blacklisted refresh tokens can't be reused"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_user_model().objects.create_user(email="user@test.com", password="testpass")
+        self.client = APIClient()
+        res = self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": "testpass"},
+        )
+        self.refresh = res.data["refresh"]
+
+    def refresh_token(self, refresh):
+        return self.client.post(reverse("user:token_refresh"), {"refresh": refresh})
+
+    def test_rotated_token_rejected(self):
+        """Test that a refresh token only works once"""
+        res = self.refresh_token(self.refresh)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access", res.data)
+        self.assertEqual(
+            self.refresh_token(self.refresh).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.assertEqual(
+            self.refresh_token(res.data["refresh"]).status_code, status.HTTP_200_OK
+        )
+
+    def test_rotated_token_rejected_after_cache_loss(self):
+        """Test that the revoked tokens table backs the cache"""
+        self.refresh_token(self.refresh)
+        cache.clear()
+        self.assertEqual(
+            self.refresh_token(self.refresh).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_refresh_does_not_look_up_revoked_tokens(self):
+        """Test that a rotating refresh only inserts its revoked token"""
+        with CaptureQueriesContext(connection) as queries:
+            self.refresh_token(self.refresh)
+        statements = [
+            query["sql"].split()[0]
+            for query in queries
+            if "core_revokedtoken" in query["sql"]
+        ]
+        self.assertEqual(statements, ["INSERT"])
+
+    def test_blacklist(self):
+        """Test that a blacklisted refresh token is rejected"""
+        res = self.client.post(
+            reverse("user:token_blacklist"), {"refresh": self.refresh}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.refresh_token(self.refresh).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_blacklist_without_rotation(self):
+        """Test that refreshes look blacklisted tokens up without rotation"""
+        self.client.post(reverse("user:token_blacklist"), {"refresh": self.refresh})
+        with override_settings(
+            SIMPLE_JWT={**settings.SIMPLE_JWT, "ROTATE_REFRESH_TOKENS": False}
+        ), self.assertRaises(TokenError):
+            RefreshToken(self.refresh)
+
+
+class AsymmetricSigningTests(TestCase):
+    """Test signing tokens with a private key published as a JWKS"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        get_user_model().objects.create_user(email="user@test.com", password="testpass")
+        self.client = APIClient()
+
+    def generate_key(self, name, algorithm):
+        path = os.path.join(self.dir, name)
+        call_command("generate_jwt_key", path, algorithm=algorithm, stdout=StringIO())
+        return path
+
+    def signing(self, algorithm, key, public_keys=()):
+        return override_settings(
+            SIMPLE_JWT={**settings.SIMPLE_JWT, "ALGORITHM": algorithm},
+            JWT_PRIVATE_KEY_FILE=key,
+            JWT_PUBLIC_KEY_FILES=list(public_keys),
+        )
+
+    def login(self):
+        res = self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": "testpass"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def me(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        res = self.client.get(reverse("user:me"))
+        self.client.credentials()
+        return res
+
+    def test_tokens_verify_with_jwks(self):
+        """Test that tokens verify with the published keys alone"""
+        for algorithm in ("RS256", "EdDSA"):
+            with self.subTest(algorithm=algorithm), self.signing(
+                algorithm, self.generate_key(algorithm, algorithm)
+            ):
+                access = self.login()["access"]
+                res = self.client.get(reverse("user:jwks"))
+                self.assertIn("public", res["Cache-Control"])
+                key_set = jwt.PyJWKSet.from_dict(res.json())
+                header = jwt.get_unverified_header(access)
+                self.assertEqual(header["alg"], algorithm)
+                key = next(key for key in key_set.keys if key.key_id == header["kid"])
+                payload = jwt.decode(access, key.key, algorithms=[algorithm])
+                self.assertEqual(payload["token_type"], "access")
+                self.assertEqual(self.me(access).status_code, status.HTTP_200_OK)
+
+    def test_refresh(self):
+        """Test that refreshed tokens are signed with the key set"""
+        with self.signing("RS256", self.generate_key("key", "RS256")):
+            res = self.client.post(
+                reverse("user:token_refresh"), {"refresh": self.login()["refresh"]}
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                self.me(res.data["access"]).status_code, status.HTTP_200_OK
+            )
+
+    def test_key_rotation(self):
+        """Test that retired keys verify until removed from the key set"""
+        old = self.generate_key("old", "RS256")
+        new = self.generate_key("new", "RS256")
+        with self.signing("RS256", old):
+            access = self.login()["access"]
+        with self.signing("RS256", new, [f"{old}.pub"]):
+            self.assertEqual(self.me(access).status_code, status.HTTP_200_OK)
+            self.assertEqual(len(self.client.get(reverse("user:jwks")).data["keys"]), 2)
+        with self.signing("RS256", new):
+            self.assertEqual(self.me(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_hmac_publishes_no_keys(self):
+        """Test that the key set is empty with the default HS256"""
+        self.assertEqual(self.client.get(reverse("user:jwks")).data, {"keys": []})
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import settings as jwt_settings
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+from core.models import RevokedToken
+from user.keys import get_token_backend
+
+
+def revoked_token_key(jti):
+    return f"revoked-token:{jti}"
+
+
+class KeySetMixin:
+    """Sign and verify with user.keys.get_token_backend()"""
+
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+
+class AccessToken(KeySetMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeySetMixin, tokens.RefreshToken):
+    """Refresh token that can't be used again once rotated or blacklisted
+
+    blacklist() claims the jti with an atomic cache add, then a RevokedToken
+    insert that survives cache restarts. A rotating refresh is two writes and
+    no lookup, however many tokens were revoked, and of two concurrent
+    refreshes with the same token only one succeeds.
+    """
+
+    access_token_class = AccessToken
+
+    def verify(self):
+        super().verify()
+        # rotating refreshes claim the token, others have to look it up
+        rotate = jwt_settings.api_settings.ROTATE_REFRESH_TOKENS
+        if not rotate and self.is_revoked():
+            raise TokenError(_("Token is blacklisted"))
+
+    def is_revoked(self):
+        jti = self.payload[jwt_settings.api_settings.JTI_CLAIM]
+        if cache.get(revoked_token_key(jti)):
+            return True
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def blacklist(self):
+        jti = self.payload[jwt_settings.api_settings.JTI_CLAIM]
+        expires_at = datetime_from_epoch(self.payload["exp"])
+        timeout = max(int((expires_at - aware_utcnow()).total_seconds()), 1)
+        if not cache.add(revoked_token_key(jti), True, timeout):
+            raise TokenError(_("Token is blacklisted"))
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            raise TokenError(_("Token is blacklisted"))
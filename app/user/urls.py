@@ -1,4 +1,8 @@
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import (
+    TokenBlacklistView,
+    TokenObtainPairView,
+    TokenRefreshView,
+)
 from django.urls import path
 from user import views
 
@@ -8,7 +12,10 @@ urlpatterns = [
     ## All Users
     path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/blacklist/", TokenBlacklistView.as_view(), name="token_blacklist"),
+    path("jwks/", views.JWKSView.as_view(), name="jwks"),
     path("me/", views.RetrieveUserView.as_view(), name="me"),
+    path("set_password/", views.SetPasswordView.as_view(), name="set_password"),
     ## Admin User
     path("create/", views.CreateUserView.as_view(), name="create"),
     path("detail/<int:pk>/", views.RetrieveUserByIdView.as_view(), name="detail"),
@@ -1,22 +1,86 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.cache import patch_cache_control
 
-from rest_framework import generics
-from rest_framework.permissions import IsAdminUser
+from rest_framework import generics, status
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.permissions import IsAuthenticated
-
-from user.serializers import UserSerializer
-
-
-class RetrieveUserView(generics.RetrieveAPIView):
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+
+from core.cache import CachedResponseMixin, invalidate, invalidate_factories
+from core.models import Factory
+from core.pagination import IdCursorPagination
+from core.views import AsyncReadMixin, ValuesListMixin
+from user.authentication import mark_user_changed
+from user.keys import get_jwks
+from user.serializers import (
+    SetPasswordSerializer,
+    UserFilterSerializer,
+    UserSerializer,
+    UserValuesSerializer,
+)
+
+
+def invalidate_user(user_id, *factory_ids):
+    """Mark the responses showing a user as changed"""
+    Factory.objects.filter(pk__in=factory_ids).bump_version()
+    invalidate(f"user:{user_id}")
+    invalidate_factories(factory_ids)
+
+
+class RetrieveUserView(CachedResponseMixin, AsyncReadMixin, generics.RetrieveAPIView):
     """Retrieve authenticated user"""
 
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_cache_scopes(self):
+        # ?expand=factory_summary shows the factory
+        return [
+            f"user:{self.request.user.pk}",
+            f"factory:{self.request.user.factory_id}",
+        ]
+
     def get_object(self):
         """Retrieve and return authenticated user"""
-        return self.request.user
+        user = self.request.user
+        if not isinstance(user, get_user_model()):
+            # stateless authentication only carries the token claims
+            return get_object_or_404(get_user_model(), pk=user.pk)
+        return user
+
+
+class SetPasswordView(generics.GenericAPIView):
+    """Set the password of a user with a one-time token"""
+
+    serializer_class = SetPasswordSerializer
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.save()
+        mark_user_changed(user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JWKSView(APIView):
+    """Public keys verifying the tokens, as a JSON Web Key Set"""
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        response = Response(get_jwks())
+        patch_cache_control(response, public=True, max_age=settings.JWKS_CACHE_TIMEOUT)
+        return response
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -26,13 +90,18 @@ class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser, IsAuthenticated]
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        user = serializer.save()
+        invalidate_user(user.pk, user.factory_id)
 
-class RetrieveUserByIdView(generics.RetrieveAPIView):
+
+class RetrieveUserByIdView(AsyncReadMixin, generics.RetrieveAPIView):
     """Retrieve user by id"""
 
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser, IsAuthenticated]
-    queryset = get_user_model().objects.all()
+    queryset = get_user_model().objects.select_related("factory")
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
@@ -46,6 +115,13 @@ class UpdateUserByIdView(generics.UpdateAPIView):
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_factory_id = serializer.instance.factory_id
+        user = serializer.save()
+        invalidate_user(user.pk, old_factory_id, user.factory_id)
+        mark_user_changed(user.pk)
+
 
 class DeleteUserByIdView(generics.DestroyAPIView):
     """Delete user by id"""
@@ -56,18 +132,31 @@ class DeleteUserByIdView(generics.DestroyAPIView):
     lookup_field = "pk"
     lookup_url_kwarg = "pk"
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        invalidate_user(instance.pk, instance.factory_id)
+        mark_user_changed(instance.pk)
+        instance.delete()
+
 
-class ListUserView(generics.ListAPIView):
-    """List all users"""
+@extend_schema(parameters=[UserFilterSerializer])
+class ListUserView(AsyncReadMixin, ValuesListMixin, generics.ListAPIView):
+    """List the users visible to the user, filtered by the query parameters"""
 
     serializer_class = UserSerializer
+    values_serializer_class = UserValuesSerializer
     permission_classes = [IsAdminUser, IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
-        """Return all users"""
-        if self.request.user.is_superuser:
-            return get_user_model().objects.all()
-        elif self.request.user.is_staff:
-            return get_user_model().objects.filter(factory=self.request.user.factory)
-        else:
-            return get_user_model().objects.filter(id=self.request.user.id)
\ No newline at end of file
+        """Return the users in the user's scope, by id"""
+        params = UserFilterSerializer(data=self.request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        # the scope comes from the token claims in stateless mode, no lookup
+        return (
+            get_user_model()
+            .objects.visible_to(self.request.user)
+            .filter(**params.get_filters())
+            .select_related("factory")
+            .order_by("id")
+        )